@@ -0,0 +1,271 @@
+import hashlib
+import mmap
+import os
+import struct
+import pygame
+
+# Shared image cache for all scenes.
+# Every image is decoded, scaled and converted to the display pixel format
+# once per size, so repeated loads and every blit after that reuse the same
+# Surface. Only the display-ready copies are kept, not the full-size sources.
+# Sounds are decoded from MP3 once and kept on disk as raw PCM (load_sound).
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Folders searched (in order) when an asset is requested by file name
+SEARCH_DIRS = [
+    BASE_DIR,
+    os.path.join(BASE_DIR, "stage2"),
+]
+
+# Pre-scaled raw copies written by bake_assets.py
+BAKED_DIR = os.path.join(BASE_DIR, "baked")
+BAKED_MAGIC = b"FMB2"
+# magic, width, height, flags, colorkey (RGBA), sha1 of the source file;
+# BGRA pixel rows follow the header, colorkey pixels with alpha 0
+BAKED_HEADER = struct.Struct("<4sHHI4s20s")
+BAKED_COLORKEY = 1
+
+# Decoded sounds: magic, mixer frequency, format, channels, sha1 of the
+# source file; raw samples in that mixer format follow the header
+PCM_MAGIC = b"FMP1"
+PCM_HEADER = struct.Struct("<4sIhH20s")
+# Set to False to only read decoded sounds, never write them (e.g. when
+# BAKED_DIR points somewhere that must not be written to)
+CACHE_SOUNDS = True
+
+# Set FRAGMENTS_MMAP=1 to back full-screen layers with memory-mapped baked
+# files: pages load lazily from the OS page cache and are shared between
+# game processes instead of each keeping its own heap copy.
+USE_MMAP = os.environ.get("FRAGMENTS_MMAP") == "1"
+
+_paths = {}      # requested name -> absolute path
+_surfaces = {}   # (path, size, alpha, variant) -> display-ready Surface,
+                 # or (Surface, rect) for cropped overlays
+_atlases = {}    # atlas name -> packed Atlas
+
+
+def resolve(name):
+    """Return the absolute path of an asset, searching the game folders"""
+    if name in _paths:
+        return _paths[name]
+
+    if os.path.isabs(name):
+        candidates = [name]
+    else:
+        candidates = [os.path.join(folder, name) for folder in SEARCH_DIRS]
+
+    for path in candidates:
+        if os.path.exists(path):
+            _paths[name] = path
+            return path
+    raise FileNotFoundError(f"Asset not found: {name}")
+
+
+def decode(name):
+    """Decode an image file at its original size"""
+    return pygame.image.load(resolve(name))
+
+
+def baked_path(path, size):
+    """Where the baked copy of an asset at the given size lives"""
+    rel = os.path.relpath(path, BASE_DIR)
+    if rel.startswith(os.pardir):
+        return None
+    return os.path.join(BAKED_DIR, f"{size[0]}x{size[1]}", rel + ".raw")
+
+
+def load_baked(path, size, mapped=False):
+    """Load a pre-scaled baked copy of an asset, or None if there is none
+
+    mapped=True wraps the file with mmap instead of reading it, so the
+    Surface pixels are the (copy-on-write) file pages themselves.
+    """
+    baked = baked_path(path, size)
+    if baked is None or not os.path.exists(baked):
+        return None
+    # Source edited since the last bake - decode it instead
+    if os.path.getmtime(baked) < os.path.getmtime(path):
+        return None
+
+    with open(baked, "rb") as f:
+        if mapped:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        else:
+            data = f.read()
+    magic, width, height, flags, colorkey, _ = BAKED_HEADER.unpack_from(data)
+    if magic != BAKED_MAGIC or (width, height) != size:
+        return None
+
+    surface = pygame.image.frombuffer(memoryview(data)[BAKED_HEADER.size:], size, "BGRA")
+    if flags & BAKED_COLORKEY:
+        surface.set_colorkey(tuple(colorkey))
+    return surface
+
+
+def _matches_display(surface):
+    display = pygame.display.get_surface()
+    return display is not None and surface.get_masks()[:3] == display.get_masks()[:3]
+
+
+def load_image(name, size=None, alpha=False, flip=False, mapped=False):
+    """Return a scaled, display-format Surface shared by every caller
+
+    alpha=True keeps per-pixel transparency (convert_alpha), otherwise the
+    image is converted to the opaque display format (colorkeys are kept).
+    flip=True mirrors the image horizontally.
+    mapped=True marks a large layer that may be served zero-copy from its
+    memory-mapped baked file when USE_MMAP is on.
+    """
+    path = resolve(name)
+    size = tuple(size) if size else None
+    key = (path, size, alpha, flip)
+    if key in _surfaces:
+        return _surfaces[key]
+
+    if flip:
+        # Mirror the cached upright copy instead of decoding the file again
+        surface = pygame.transform.flip(load_image(path, size, alpha), True, False)
+        _surfaces[key] = surface
+        return surface
+
+    mapped = mapped and USE_MMAP and size is not None
+    surface = load_baked(path, size, mapped) if size else None
+    if surface is not None and alpha:
+        # The baked alpha channel already clears the colorkey pixels
+        surface.set_colorkey(None)
+    if mapped and surface is not None and _matches_display(surface):
+        # Already in the display layout, blit straight from the mapped pages
+        if not alpha:
+            surface.set_alpha(None)
+        _surfaces[key] = surface
+        return surface
+
+    if surface is None:
+        surface = decode(path)
+        if size and surface.get_size() != size:
+            surface = pygame.transform.scale(surface, size)
+    surface = surface.convert_alpha() if alpha else surface.convert()
+
+    _surfaces[key] = surface
+    return surface
+
+
+def content_rect(surface, reference=None, tolerance=16):
+    """Bounding rect of a surface's visible pixels
+
+    With a reference surface of the same size, the rect covers only the
+    pixels that differ from it instead. Channel differences below
+    tolerance are treated as compression noise.
+    """
+    if reference is None:
+        return surface.get_bounding_rect()
+
+    # |surface - reference| per channel, zero wherever the two agree
+    diff = surface.copy()
+    diff.blit(reference, (0, 0), special_flags=pygame.BLEND_RGBA_SUB)
+    back = reference.copy()
+    back.blit(surface, (0, 0), special_flags=pygame.BLEND_RGBA_SUB)
+    diff.blit(back, (0, 0), special_flags=pygame.BLEND_RGBA_ADD)
+
+    mask = pygame.mask.from_threshold(diff, (0, 0, 0, 0), (tolerance,) * 4)
+    mask.invert()
+    rects = mask.get_bounding_rects()
+    if not rects:
+        return pygame.Rect(0, 0, 0, 0)
+    return rects[0].unionall(rects[1:])
+
+
+def load_overlay(name, size, reference=None, **kwargs):
+    """Load a full-screen overlay cropped to the region it actually covers
+
+    Returns (surface, rect), rect being where the crop goes on screen.
+    With a reference image the crop is where the overlay differs from it,
+    e.g. the one highlighted key of a whole-piano image.
+    """
+    path = resolve(name)
+    size = tuple(size)
+    key = (path, size, True, ("crop", reference))
+    if key in _surfaces:
+        return _surfaces[key]
+
+    full = load_image(path, size, alpha=True, **kwargs)
+    base = load_image(reference, size, alpha=True, **kwargs) if reference else None
+    rect = content_rect(full, base)
+    overlay = (full.subsurface(rect).copy(), rect)
+    # Only the crop is kept, the full-screen copy can be freed
+    del _surfaces[(path, size, True, False)]
+
+    _surfaces[key] = overlay
+    return overlay
+
+
+def load_atlas(name, build):
+    """Return the atlas cached under name, packing it with build() the first time"""
+    if name not in _atlases:
+        _atlases[name] = build()
+    return _atlases[name]
+
+
+def pcm_path(path, mixer):
+    """Where the decoded samples of a sound live for the given mixer settings"""
+    rel = os.path.relpath(path, BASE_DIR)
+    if rel.startswith(os.pardir):
+        return None
+    frequency, fmt, channels = mixer
+    return os.path.join(BAKED_DIR, "pcm", f"{frequency}_{fmt}_{channels}", rel + ".pcm")
+
+
+def load_sound(name, write_cache=None):
+    """Return a mixer Sound, decoding the file only the first time
+
+    The decoded samples are written under baked/pcm/ in the mixer's own
+    format and checked against the source's sha1, so later launches build
+    the Sound straight from that buffer instead of decoding the MP3.
+    write_cache=False (default: CACHE_SOUNDS) only reads that cache.
+    """
+    path = resolve(name)
+    mixer = pygame.mixer.get_init()
+    cached = pcm_path(path, mixer) if mixer else None
+    if cached is None:
+        return pygame.mixer.Sound(path)
+
+    with open(path, "rb") as f:
+        digest = hashlib.sha1(f.read()).digest()
+    try:
+        with open(cached, "rb") as f:
+            data = f.read()
+        if PCM_HEADER.unpack_from(data) == (PCM_MAGIC, *mixer, digest):
+            return pygame.mixer.Sound(buffer=data[PCM_HEADER.size:])
+    except (OSError, struct.error):
+        pass
+
+    sound = pygame.mixer.Sound(path)
+    if not (CACHE_SOUNDS if write_cache is None else write_cache):
+        return sound
+    try:
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        tmp_path = f"{cached}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(PCM_HEADER.pack(PCM_MAGIC, *mixer, digest))
+            f.write(sound.get_raw())
+        os.replace(tmp_path, cached)
+    except OSError:
+        # Read-only install: decode again next launch
+        pass
+    return sound
+
+
+def evict(name):
+    """Drop every cached Surface made from one asset (or a whole atlas)"""
+    if _atlases.pop(name, None) is not None:
+        return
+    path = resolve(name)
+    for key in [key for key in _surfaces if key[0] == path]:
+        del _surfaces[key]
+
+
+def clear():
+    """Drop every cached Surface (e.g. after the display mode changes)"""
+    _surfaces.clear()
+    _atlases.clear()
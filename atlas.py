@@ -0,0 +1,75 @@
+import pygame
+
+# Texture atlas: many small sprites packed into one or a few shared sheets.
+# Scenes blit sub-rects of a sheet instead of keeping a Surface per sprite.
+
+SHEET_SIZE = 2048
+PADDING = 1
+
+
+class Atlas:
+    def __init__(self, sheet_size=SHEET_SIZE, rle=False):
+        self.sheet_size = sheet_size
+        # Run-length encode the sheets: much faster for sprites that are
+        # mostly clear or opaque, a little slower for translucent ones
+        self.rle = rle
+        self.sheets = []
+        self.rects = {}       # label -> (sheet index, rect on the sheet, draw offset)
+        self.pending = []
+
+    def add(self, label, surface, offset=(0, 0), alpha=None):
+        """Queue a sprite for packing
+
+        offset is added to the position the sprite is drawn at (e.g. the
+        screen position of a cropped overlay). alpha bakes a surface alpha
+        (set_alpha) into the sprite's pixels so sprites that need different
+        transparency can still share a sheet; blending rounds slightly
+        differently, so drawn pixels can be 1 off per channel.
+        """
+        sprite = surface.convert_alpha()
+        if alpha is not None:
+            sprite.fill((255, 255, 255, alpha), special_flags=pygame.BLEND_RGBA_MULT)
+        self.pending.append((label, sprite, tuple(offset)))
+        return self
+
+    def pack(self):
+        """Lay the queued sprites out on shelves and build the sheets"""
+        placements = []   # (sheet index, label, sprite, offset, position)
+        index = x = y = shelf_height = 0
+        used = [0, 0]
+        sheet_sizes = []
+
+        for label, sprite, offset in sorted(self.pending, key=lambda e: e[1].get_height(), reverse=True):
+            width, height = sprite.get_size()
+            if x > 0 and x + width > self.sheet_size:
+                x, y = 0, y + shelf_height
+                shelf_height = 0
+            if y > 0 and y + height > self.sheet_size:
+                sheet_sizes.append(tuple(used))
+                index, x, y, shelf_height = index + 1, 0, 0, 0
+                used = [0, 0]
+            placements.append((index, label, sprite, offset, (x, y)))
+            used = [max(used[0], x + width), max(used[1], y + height)]
+            x += width + PADDING
+            shelf_height = max(shelf_height, height + PADDING)
+        sheet_sizes.append(tuple(used))
+
+        self.sheets = [pygame.Surface(size, pygame.SRCALPHA).convert_alpha() for size in sheet_sizes]
+        for index, label, sprite, offset, pos in placements:
+            # Copy the pixels as they are instead of blending onto the empty sheet
+            sprite.set_alpha(None)
+            rect = self.sheets[index].blit(sprite, pos)
+            self.rects[label] = (index, rect, offset)
+        if self.rle:
+            for sheet in self.sheets:
+                sheet.set_alpha(255, pygame.RLEACCEL)
+        self.pending = []
+        return self
+
+    def get_size(self, label):
+        return self.rects[label][1].size
+
+    def blit(self, target, label, pos=(0, 0)):
+        """Draw a sprite; target can be a Surface or anything with the same blit()"""
+        index, rect, offset = self.rects[label]
+        return target.blit(self.sheets[index], (pos[0] + offset[0], pos[1] + offset[1]), rect)
@@ -0,0 +1,179 @@
+import argparse
+import glob
+import hashlib
+import os
+import sys
+import numpy as np
+import pygame
+import assets
+
+# Bakes the game images into pre-scaled raw pixel files under baked/,
+# so the games can load them with pygame.image.frombuffer instead of
+# decoding and scaling full-HD PNGs on every launch. Sounds are decoded to
+# raw PCM for the default mixer settings (the games also do this on first
+# load, see assets.load_sound).
+#
+#   python bake_assets.py           rebuild assets whose source changed
+#   python bake_assets.py --force   rebuild everything
+#   python bake_assets.py --check   compare baked and decoded loads
+
+# Sizes each group of images is drawn at by the games
+BAKE_TARGETS = [
+    # Full-screen layers (pygameee.py, fewf.py, piano.py)
+    ((1200, 800), ["scene3.png", "piano.png", "piano ?.png", "mysterybg.png"]),
+    # puzzle.py background
+    ((800, 650), ["mysterybg.png"]),
+    # mother backgrounds
+    ((900, 700), ["mirror_images/room_bg.jpg"]),
+    ((480, 380), ["mirror_images/mother_daughter.jpg"]),
+    # Walk cycle sprites
+    ((100, 130), ["pic?.gif"]),
+    # Memory cards (puzzle.py)
+    ((160, 160), ["stage2/*.jpg", "stage2/*.png", "stage2/*.webp"]),
+]
+
+# Sounds played by the games
+BAKE_SOUNDS = ["piano notes/*.mp3", "sound effects/*.mp3"]
+
+
+def source_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).digest()
+
+
+def is_up_to_date(out_path, size, digest):
+    if not os.path.exists(out_path):
+        return False
+    with open(out_path, "rb") as f:
+        header = f.read(assets.BAKED_HEADER.size)
+    if len(header) < assets.BAKED_HEADER.size:
+        return False
+    magic, width, height, _, _, baked_digest = assets.BAKED_HEADER.unpack(header)
+    return magic == assets.BAKED_MAGIC and (width, height) == size and baked_digest == digest
+
+
+def bake(path, size, force=False):
+    """Write the baked copy of one image, returns False if it was already current"""
+    out_path = assets.baked_path(path, size)
+    digest = source_digest(path)
+    if not force and is_up_to_date(out_path, size, digest):
+        # Same content, but the source may have a newer mtime (e.g. after a checkout)
+        os.utime(out_path)
+        return False
+
+    surface = pygame.image.load(path)
+    if surface.get_size() != size:
+        surface = pygame.transform.scale(surface, size)
+
+    flags = 0
+    colorkey = (0, 0, 0, 0)
+    if surface.get_colorkey() is not None:
+        flags |= assets.BAKED_COLORKEY
+        colorkey = surface.get_colorkey()
+
+    data = np.frombuffer(bytearray(pygame.image.tostring(surface, "BGRA")), np.uint8).reshape(-1, 4)
+    if flags & assets.BAKED_COLORKEY:
+        # Clear the colorkey pixels (by palette index, not color, so other
+        # pixels of the same color stay opaque like convert_alpha() keeps them)
+        data[:, 3] = pygame.surfarray.array_colorkey(surface).T.ravel()
+
+    header = assets.BAKED_HEADER.pack(assets.BAKED_MAGIC, size[0], size[1], flags, bytes(colorkey), digest)
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(data.tobytes())
+    os.replace(tmp_path, out_path)
+    return True
+
+
+def pixels(surface):
+    """RGBA bytes of a surface as drawn, colorkey pixels transparent"""
+    flat = pygame.Surface(surface.get_size(), pygame.SRCALPHA)
+    flat.blit(surface, (0, 0))
+    return np.frombuffer(pygame.image.tostring(flat, "RGBA"), np.uint8)
+
+
+def check(path, size):
+    """Largest channel difference between the baked and decoded loads of an image"""
+    worst = 0
+    for alpha in (False, True):
+        assets.clear()
+        baked = assets.load_image(path, size, alpha=alpha)
+        decoded = assets.decode(path)
+        if decoded.get_size() != size:
+            decoded = pygame.transform.scale(decoded, size)
+        decoded = decoded.convert_alpha() if alpha else decoded.convert()
+        diff = np.abs(pixels(baked).astype(np.int16) - pixels(decoded)).max()
+        worst = max(worst, int(diff))
+    return worst
+
+
+def bake_sound(path, force=False):
+    """Write the decoded PCM of one sound, returns False if it was already current"""
+    mixer = pygame.mixer.get_init()
+    out_path = assets.pcm_path(path, mixer)
+    if os.path.exists(out_path):
+        with open(out_path, "rb") as f:
+            header = f.read(assets.PCM_HEADER.size)
+        current = (len(header) == assets.PCM_HEADER.size and
+                   assets.PCM_HEADER.unpack(header) == (assets.PCM_MAGIC, *mixer, source_digest(path)))
+        if current and not force:
+            return False
+        os.remove(out_path)
+    assets.load_sound(path, write_cache=True)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-scale game images into raw pixel files")
+    parser.add_argument("--force", action="store_true", help="rebuild every asset, even if unchanged")
+    parser.add_argument("--check", action="store_true",
+                        help="check that every baked image loads the same as the decoded file")
+    args = parser.parse_args()
+
+    if args.check:
+        pygame.display.set_mode((1, 1), pygame.HIDDEN)
+        mismatched = 0
+        for size, patterns in BAKE_TARGETS:
+            for pattern in patterns:
+                for path in sorted(glob.glob(os.path.join(assets.BASE_DIR, pattern))):
+                    name = os.path.relpath(path, assets.BASE_DIR)
+                    if assets.load_baked(path, size) is None:
+                        print(f"Not baked: {name} at {size[0]}x{size[1]}")
+                        mismatched += 1
+                    elif check(path, size):
+                        print(f"Differs from the decoded file: {name} at {size[0]}x{size[1]}")
+                        mismatched += 1
+        print(f"{mismatched} baked images missing or different")
+        sys.exit(1 if mismatched else 0)
+
+    baked = skipped = 0
+    for size, patterns in BAKE_TARGETS:
+        for pattern in patterns:
+            for path in sorted(glob.glob(os.path.join(assets.BASE_DIR, pattern))):
+                name = os.path.relpath(path, assets.BASE_DIR)
+                if bake(path, size, args.force):
+                    baked += 1
+                    print(f"Baked {name} at {size[0]}x{size[1]}")
+                else:
+                    skipped += 1
+
+    try:
+        pygame.mixer.init()
+    except pygame.error as e:
+        print(f"No audio device, sounds not baked: {e}")
+    else:
+        for pattern in BAKE_SOUNDS:
+            for path in sorted(glob.glob(os.path.join(assets.BASE_DIR, pattern))):
+                if bake_sound(path, args.force):
+                    baked += 1
+                    print(f"Baked {os.path.relpath(path, assets.BASE_DIR)}")
+                else:
+                    skipped += 1
+
+    print(f"{baked} baked, {skipped} up to date")
+
+
+if __name__ == "__main__":
+    main()
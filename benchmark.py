@@ -0,0 +1,303 @@
+import argparse
+import atexit
+import functools
+import gc
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import zlib
+
+# Render and load-time benchmarks for all five scenes.
+# Scenes are set up headless on SDL's dummy video driver, with their
+# artwork swapped for synthetic stand-ins of the same source sizes, so the
+# numbers don't depend on the art files. Every case gets warmup calls and
+# then repeated timed rounds; the median per call is compared against a
+# saved baseline and any case slower than the tolerance fails the run.
+#
+#   python benchmark.py --save          # record the baseline on this machine
+#   python benchmark.py                 # compare, exit 1 on a regression
+#   python benchmark.py --filter mother
+
+os.environ["FRAGMENTS_HEADLESS"] = "1"
+os.environ.setdefault("FRAGMENTS_MIRROR_SEED", "1")
+
+import numpy as np
+import pygame
+import assets
+from simulate import load_scene
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BASE_DIR, "benchmark_baseline.json")
+
+WARMUP = 10
+ROUNDS = 15
+ROUND_MS = 20           # calls per round are picked so a round takes about this long
+TOLERANCE = 0.25        # fail when the median is this much slower than the baseline
+
+MIRROR_GRIDS = ["5x4", "10x8", "20x15", "40x30"]
+
+# Source sizes of the real artwork, so decoding and scaling cost the same
+SOURCE_SIZES = {
+    "scene3.png": (1920, 1080),
+    "piano.png": (1920, 1080),
+    "mysterybg.png": (1920, 1080),
+    "pic1.gif": (31, 58),
+    "pic2.gif": (29, 56),
+    "pic3.gif": (38, 58),
+    "pic4.gif": (32, 55),
+    "flower.png": (360, 360),
+    "diploma.jpg": (1000, 1000),
+    "handshake.png": (360, 360),
+    "evil.jpg": (225, 225),
+    "crying.webp": (800, 800),
+    "death.png": (626, 626),
+}
+PIANO_KEYS = "abcdefg"
+for _note in PIANO_KEYS:
+    SOURCE_SIZES[f"piano {_note}.png"] = (1920, 1080)
+# Stand-ins with transparent surroundings, like the originals
+TRANSPARENT = {"piano.png", "pic1.gif", "pic2.gif", "pic3.gif", "pic4.gif"}
+
+
+@functools.lru_cache(maxsize=None)
+def _standin(name):
+    width, height = SOURCE_SIZES[name]
+    rng = np.random.default_rng(zlib.crc32(name.encode()))
+    # Smooth colour noise rather than a flat fill
+    noise = pygame.surfarray.make_surface(rng.integers(0, 256, (16, 9, 3), dtype=np.uint8))
+    surface = pygame.Surface((width, height), pygame.SRCALPHA if name in TRANSPARENT else 0)
+    surface.blit(pygame.transform.smoothscale(noise, (width, height)), (0, 0))
+    if name in TRANSPARENT:
+        # Opaque ellipse (a sprite, or the piano across the lower half), clear around it
+        alpha = pygame.surfarray.pixels_alpha(surface)
+        alpha[:] = 0
+        del alpha
+        shape = pygame.Surface((width, height), pygame.SRCALPHA)
+        area = (0, height // 2, width, height // 2) if name == "piano.png" else (0, 0, width, height)
+        pygame.draw.ellipse(shape, (255, 255, 255, 255), area)
+        surface.blit(shape, (0, 0), special_flags=pygame.BLEND_RGBA_MAX)
+    return surface
+
+
+def standin(name):
+    """Synthetic copy of an artwork file: same size, made up pixels"""
+    if name.startswith("piano ") and name[6] in PIANO_KEYS:
+        # The whole piano with one key lit, like the real key images
+        surface = _standin("piano.png").copy()
+        width, height = surface.get_size()
+        index = PIANO_KEYS.index(name[6])
+        key = pygame.Rect(width * (20 + index * 9) // 100, height * 60 // 100, width * 8 // 100, height * 35 // 100)
+        surface.fill((255, 250, 200, 255), key)
+        return surface
+    return _standin(name).copy()
+
+
+def decode_standin(path, _decode=assets.decode):
+    name = os.path.basename(path)
+    if name in SOURCE_SIZES:
+        return standin(name)
+    return _decode(path)
+
+
+def use_standins():
+    """Route every asset decode to the stand-ins, bypassing baked copies
+
+    The baked folder becomes an empty temporary one, removed at the end,
+    so a run never reads or writes anything in the working tree.
+    """
+    assets.decode = decode_standin
+    assets.BAKED_DIR = tempfile.mkdtemp(prefix="fragments-benchmark-")
+    assets.CACHE_SOUNDS = False
+    atexit.register(shutil.rmtree, assets.BAKED_DIR, ignore_errors=True)
+    assets.clear()
+
+
+def measure(call, warmup=WARMUP, rounds=ROUNDS):
+    """Milliseconds per call for each timed round"""
+    for _ in range(warmup):
+        call()
+    start = time.perf_counter_ns()
+    call()
+    once = max(time.perf_counter_ns() - start, 1)
+    number = max(1, int(ROUND_MS * 1e6 / once))
+
+    samples = []
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            start = time.perf_counter_ns()
+            for _ in range(number):
+                call()
+            samples.append((time.perf_counter_ns() - start) / number / 1e6)
+    finally:
+        gc.enable()
+    return samples
+
+
+# Cases: name -> (scene file, environment, case(scene) returning the call to time)
+CASES = {}
+
+
+def case(name, scene, env=None):
+    def register(setup):
+        CASES[name] = (scene, env or {}, setup)
+        return setup
+    return register
+
+
+def forest_case(moving):
+    def setup(ns):
+        state, view = ns["state"], ns["forest_view"]
+        if "enter_stage" in ns:
+            ns["enter_stage"](ns["STAGE_FOREST"])
+        else:
+            state.stage_state = ns["STAGE_FOREST"]
+        state.x, state.y = 250, 630
+
+        def call():
+            if moving:
+                # Walk back and forth so the dirty rects move every frame
+                state.x = 250 + (state.x - 245) % 600
+                state.current_img = (state.current_img + 1) % 4
+            else:
+                view.invalidate()
+            ns["render_forest"]()
+            view.present()
+        return call
+    return setup
+
+
+def piano_case(piano_state, key_down):
+    def setup(ns):
+        state = ns["state"]
+        if "enter_stage" in ns:
+            ns["enter_stage"](ns["STAGE_PIANO"])
+        else:
+            state.stage_state = ns["STAGE_PIANO"]
+        state.piano_state = ns[piano_state]
+        state.player_sequence = list(state.current_sequence)
+        state.active_key = pygame.K_c if key_down else None
+        state.key_pressed_time = 1 << 40    # keep piano.py's key highlight lit
+        return ns["render_piano"]
+    return setup
+
+
+for _scene in ("pygameee.py", "piano.py"):
+    _label = _scene[:-3]
+    case(f"{_label}/render_forest full", _scene)(forest_case(moving=False))
+    case(f"{_label}/render_forest dirty", _scene)(forest_case(moving=True))
+    case(f"{_label}/render_piano", _scene)(piano_case("STATE_GUESSING", key_down=True))
+    case(f"{_label}/render_piano feedback", _scene)(piano_case("STATE_FEEDBACK", key_down=False))
+
+
+def puzzle_case(face_up):
+    def setup(ns):
+        game = ns["Game"]()
+        for card in game.cards:
+            card.selected = face_up
+        return game.draw
+    return setup
+
+
+case("puzzle/draw face-down", "puzzle.py")(puzzle_case(face_up=False))
+case("puzzle/draw face-up", "puzzle.py")(puzzle_case(face_up=True))
+
+
+def mirror_case(ns):
+    return ns["Game"]().draw
+
+
+for _grid in MIRROR_GRIDS:
+    case(f"mother/draw {_grid}", "mother", {"FRAGMENTS_MIRROR_GRID": _grid})(mirror_case)
+
+
+def load_case(load, name, *args, **kwargs):
+    # Cold loads: the cached copy is dropped before every call
+    def setup(ns):
+        def call():
+            assets.evict(name)
+            load(name, *args, **kwargs)
+        return call
+    return setup
+
+
+case("assets/load background 1920x1080", "piano.py")(load_case(assets.load_image, "scene3.png", (1920, 1080)))
+case("assets/load card 160x160", "piano.py")(load_case(assets.load_image, "diploma.jpg", (160, 160), alpha=True))
+case("assets/load piano key overlay", "piano.py")(
+    load_case(assets.load_overlay, "piano c.png", (1920, 1080), "piano.png"))
+
+
+@functools.lru_cache(maxsize=None)
+def scene(name, env):
+    """Set a scene up once per environment"""
+    os.environ.update(dict(env))
+    return load_scene(name)
+
+
+def run(names):
+    results = {}
+    for name in names:
+        scene_name, env, setup = CASES[name]
+        call = setup(scene(scene_name, tuple(sorted(env.items()))))
+        samples = measure(call)
+        median = statistics.median(samples)
+        spread = (max(samples) - min(samples)) / median * 100 if median else 0
+        results[name] = median
+        print(f"{name:<38} {median:9.3f} ms  (min {min(samples):.3f}, spread {spread:.0f}%)")
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Print each case against the baseline; True when none regressed"""
+    ok = True
+    print(f"\nAgainst the baseline (tolerance {tolerance:.0%}):")
+    for name, median in results.items():
+        if name not in baseline:
+            print(f"  {name:<38} new")
+            continue
+        change = median / baseline[name] - 1
+        regressed = change > tolerance
+        ok = ok and not regressed
+        print(f"  {name:<38} {baseline[name]:9.3f} -> {median:9.3f} ms  {change:+7.1%}"
+              f"{'  REGRESSION' if regressed else ''}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark rendering and asset loading of every scene")
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON file")
+    parser.add_argument("--save", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="allowed slowdown against the baseline (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    use_standins()
+    names = [name for name in CASES if args.filter in name]
+    results = run(names)
+
+    if args.save:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"\nBaseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if not compare(results, baseline, args.tolerance):
+            print("\nFAILED: slower than the baseline")
+            sys.exit(1)
+    else:
+        print(f"\nNo baseline at {args.baseline}, run with --save to record one")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,16 @@ import pygame
 import sys
 import random
 from pygame.locals import *
+import assets
+from atlas import Atlas
+from loader import AssetLoader
+from sim import HEADLESS, IDLE_TIMEOUT, clock, key_state, timestep
+from replay import inputs
+from render import DirtyRenderer, tint
+from fonts import get_font
+from text_cache import render as render_text
+from synth import note_sound
+from profiler import profiler
 
 # Initialize pygame
 pygame.init()
@@ -33,24 +43,54 @@ STATE_LISTENING = 2  # Computer playing sequence
 STATE_GUESSING = 3   # Player guessing sequence
 STATE_FEEDBACK = 4   # Showing right/wrong feedback
 
+# State names shown by the profiler
+STAGE_NAMES = {STAGE_FOREST: "STAGE_FOREST", STAGE_PIANO: "STAGE_PIANO", VICTORY_SCREEN: "VICTORY_SCREEN"}
+STATE_NAMES = {STATE_PIANO: "STATE_PIANO", STATE_LISTENING: "STATE_LISTENING",
+               STATE_GUESSING: "STATE_GUESSING", STATE_FEEDBACK: "STATE_FEEDBACK"}
+
+# Piano configuration
+piano_notes = [
+    {'key': K_a, 'name': 'A', 'color': (255, 100, 100), 'sound': None},
+    {'key': K_b, 'name': 'B', 'color': (255, 180, 100), 'sound': None},
+    {'key': K_c, 'name': 'C', 'color': (255, 255, 100), 'sound': None},
+    {'key': K_d, 'name': 'D', 'color': (100, 255, 100), 'sound': None},
+    {'key': K_e, 'name': 'E', 'color': (100, 255, 255), 'sound': None},
+    {'key': K_f, 'name': 'F', 'color': (100, 100, 255), 'sound': None},
+    {'key': K_g, 'name': 'G', 'color': (200, 100, 255), 'sound': None}
+]
+
+def build_character_atlas():
+    """Walk cycle frames, labelled (direction, frame)"""
+    sheet = Atlas(rle=True)
+    for i in range(4):
+        sheet.add(('right', i), assets.load_image(f"pic{i + 1}.gif", (100, 130)))
+        sheet.add(('left', i), assets.load_image(f"pic{i + 1}.gif", (100, 130), flip=True))
+        assets.evict(f"pic{i + 1}.gif")
+    return sheet.pack()
+
+# Assets this scene needs before it can start, decoded on a worker thread
+# while the window shows a progress screen
+loader = AssetLoader()
+loader.image("forest_bg", "scene3.png", (WIDTH, HEIGHT), mapped=True)
+loader.atlas("characters", "characters", build_character_atlas)
+loader.image("piano_bg", "piano_background.png", (WIDTH, HEIGHT), mapped=True)
+for note in piano_notes:
+    loader.sound(note['name'], f"piano notes/{note['name']}3.mp3")
+loader.show_progress(screen)
+
 # Load images
 try:
     # Forest background
-    forest_bg = pygame.image.load("C:/Users/USER/Documents/GitHub/FragmentsOfMaya/fragments/scene3.png")
-    forest_bg = pygame.transform.scale(forest_bg, (WIDTH, HEIGHT))
+    forest_bg = loader.get("forest_bg")
     
     # Character animations
-    character_images = {
-        'right': [pygame.transform.scale(pygame.image.load(f'C:/Users/USER/Documents/GitHub/FragmentsOfMaya/fragments/pic{i}.gif'), (100, 130)) for i in range(1, 5)],
-        'left': [pygame.transform.flip(pygame.transform.scale(pygame.image.load(f'C:/Users/USER/Documents/GitHub/FragmentsOfMaya/fragments/pic{i}.gif'), (100, 130)), True, False) for i in range(1, 5)]
-    }
+    characters = loader.get("characters")
     
     # Piano background - full screen
     piano_bg = pygame.Surface((WIDTH, HEIGHT))
     piano_bg.fill(DARK_BLUE)
     try:
-        piano_img = pygame.image.load("C:/Users/USER/Documents/GitHub/FragmentsOfMaya/fragments/piano_background.png")
-        piano_bg = pygame.transform.scale(piano_img, (WIDTH, HEIGHT))
+        piano_bg = loader.get("piano_bg")
     except:
         print("Using solid color piano background")
 
@@ -87,33 +127,25 @@ except Exception as e:
         pygame.draw.line(character_images['right'][i], BLACK, (50, 90), (20, 120), 3)
         character_images['left'][i].blit(character_images['right'][i], (0, 0))
     
+    characters = Atlas()
+    for direction, frames in character_images.items():
+        for i, frame in enumerate(frames):
+            characters.add((direction, i), frame)
+    characters.pack()
+    
     piano_bg = pygame.Surface((WIDTH, HEIGHT))
     piano_bg.fill(DARK_BLUE)
     key_overlays = {k: pygame.Surface((WIDTH//7, 200), pygame.SRCALPHA) for k in [K_a, K_b, K_c, K_d, K_e, K_f, K_g]}
     for surf in key_overlays.values():
         surf.fill((255, 255, 255, 120))
 
-# Piano configuration
-piano_notes = [
-    {'key': K_a, 'name': 'A', 'color': (255, 100, 100), 'sound': None},
-    {'key': K_b, 'name': 'B', 'color': (255, 180, 100), 'sound': None},
-    {'key': K_c, 'name': 'C', 'color': (255, 255, 100), 'sound': None},
-    {'key': K_d, 'name': 'D', 'color': (100, 255, 100), 'sound': None},
-    {'key': K_e, 'name': 'E', 'color': (100, 255, 255), 'sound': None},
-    {'key': K_f, 'name': 'F', 'color': (100, 100, 255), 'sound': None},
-    {'key': K_g, 'name': 'G', 'color': (200, 100, 255), 'sound': None}
-]
-
 # Load sounds
 for note in piano_notes:
     try:
-        note['sound'] = pygame.mixer.Sound(f"C:/Users/USER/Documents/GitHub/FragmentsOfMaya/fragments/piano_notes/{note['name']}3.mp3")
+        note['sound'] = loader.get(note['name'])
     except:
-        print(f"Couldn't load sound for {note['name']}")
-        arr = pygame.sndarray.array(note['sound']) if note['sound'] else None
-        if arr is not None:
-            arr[:] = 0
-            note['sound'] = pygame.mixer.Sound(buffer=arr)
+        print(f"Couldn't load sound for {note['name']}, synthesizing it")
+        note['sound'] = note_sound(f"{note['name']}3")
 
 key_to_note = {note['key']: note for note in piano_notes}
 
@@ -129,6 +161,7 @@ class GameState:
         # Forest variables
         self.x = 250
         self.y = 630
+        self.prev_x, self.prev_y = self.x, self.y  # before the last update, for interpolation
         self.y_velocity = 0
         self.is_jumping = False
         self.current_img = 0
@@ -155,6 +188,15 @@ class GameState:
         # Victory screen
         self.victory_time = 0
 
+    def place(self, x, y):
+        """Move the player at once, without interpolating from the old spot"""
+        self.x = self.prev_x = x
+        self.y = self.prev_y = y
+
+    def draw_position(self):
+        """Where to draw the player, between its last two updates"""
+        return timestep.interpolate(self.prev_x, self.x), timestep.interpolate(self.prev_y, self.y)
+
     def generate_sequence(self):
         self.sequence_length = 3 + self.current_stage
         available_notes = [note['name'] for note in piano_notes]
@@ -163,24 +205,24 @@ class GameState:
         self.current_note_index = 0
 
 state = GameState()
-clock = pygame.time.Clock()
-font_large = pygame.font.Font(None, 120)
-font_medium = pygame.font.Font(None, 48)
-font_small = pygame.font.Font(None, 36)
+forest_view = DirtyRenderer(screen)
+font_large = get_font(None, 120)
+font_medium = get_font(None, 48)
+font_small = get_font(None, 36)
 
 def play_note(note_name):
     for note in piano_notes:
         if note['name'] == note_name and note['sound']:
             note['sound'].play()
             state.active_key = note['key']
-            state.key_pressed_time = pygame.time.get_ticks()
+            state.key_pressed_time = clock.get_ticks()
             return note['key']
     return None
 
 def play_sequence():
     state.sequence_playing = True
     state.current_note_index = 0
-    state.note_time = pygame.time.get_ticks()
+    state.note_time = clock.get_ticks()
 
 def handle_forest_events(event):
     if event.type == KEYDOWN:
@@ -194,40 +236,41 @@ def handle_piano_events(event):
     if event.type == KEYDOWN:
         if event.key == K_ESCAPE:
             state.stage_state = STAGE_FOREST
-            state.x, state.y = 250, 630
+            state.place(250, 630)
         elif event.key == K_RETURN:
             if state.piano_state == STATE_PIANO:
                 play_sequence()
                 state.piano_state = STATE_LISTENING
             elif state.piano_state == STATE_GUESSING and len(state.player_sequence) == len(state.current_sequence):
                 state.piano_state = STATE_FEEDBACK
-                state.feedback_time = pygame.time.get_ticks()
+                state.feedback_time = clock.get_ticks()
         elif event.key == K_BACKSPACE and state.piano_state == STATE_GUESSING:
             if state.player_sequence:
                 state.player_sequence.pop()
-        elif event.key == K_r and state.piano_state == STATE_GUESSING and pygame.time.get_ticks() - state.replay_cooldown > 1000:
+        elif event.key == K_r and state.piano_state == STATE_GUESSING and clock.get_ticks() - state.replay_cooldown > 1000:
             play_sequence()
             state.piano_state = STATE_LISTENING
-            state.replay_cooldown = pygame.time.get_ticks()
+            state.replay_cooldown = clock.get_ticks()
         elif event.key in key_to_note and state.piano_state != STATE_FEEDBACK:
             note = key_to_note[event.key]
             if note['sound']:
                 note['sound'].play()
             state.active_key = event.key
-            state.key_pressed_time = pygame.time.get_ticks()
+            state.key_pressed_time = clock.get_ticks()
             if state.piano_state == STATE_GUESSING:
                 state.player_sequence.append(note['name'])
                 if len(state.player_sequence) <= len(state.current_sequence):
                     if note['name'] != state.current_sequence[len(state.player_sequence)-1]:
                         state.last_wrong_key = event.key
-                        state.wrong_key_time = pygame.time.get_ticks()
+                        state.wrong_key_time = clock.get_ticks()
     
     if event.type == KEYUP and event.key in key_to_note:
         if state.active_key == event.key:
             state.active_key = None
 
 def update_forest():
-    keys = pygame.key.get_pressed()
+    state.prev_x, state.prev_y = state.x, state.y
+    keys = key_state.get_pressed()
     
     if keys[K_LEFT] or keys[K_a]:
         state.x -= 5
@@ -237,9 +280,9 @@ def update_forest():
         state.direction = 'right'
     
     if (keys[K_LEFT] or keys[K_RIGHT] or keys[K_a] or keys[K_d]):
-        if pygame.time.get_ticks() - state.last_switch > 300:
+        if clock.get_ticks() - state.last_switch > 300:
             state.current_img = (state.current_img + 1) % 4
-            state.last_switch = pygame.time.get_ticks()
+            state.last_switch = clock.get_ticks()
     
     if state.is_jumping:
         state.y += state.y_velocity
@@ -252,7 +295,7 @@ def update_forest():
     state.x = max(-100, min(WIDTH, state.x))
 
 def update_piano():
-    current_time = pygame.time.get_ticks()
+    current_time = clock.get_ticks()
     
     if state.piano_state == STATE_LISTENING and state.sequence_playing:
         if current_time - state.note_time > 500:
@@ -291,26 +334,27 @@ def update_piano():
         state.active_key = None
 
 def update_victory():
-    current_time = pygame.time.get_ticks()
+    current_time = clock.get_ticks()
     if current_time - state.victory_time > 5000:
         state.current_stage = 1
         state.current_phase = 1
         state.stage_state = STAGE_FOREST
-        state.x, state.y = 250, 630
+        state.place(250, 630)
         state.generate_sequence()
 
 def render_forest():
-    screen.blit(forest_bg, (0, 0))
-    screen.blit(character_images[state.direction][state.current_img], (state.x, state.y))
+    # Only the sprite and label rects are redrawn over the background
+    forest_view.begin(forest_bg)
+    characters.blit(forest_view, (state.direction, state.current_img), state.draw_position())
     
     if state.show_message:
-        text = font_small.render("Press X for piano challenge", True, WHITE)
+        text = render_text(font_small, "Press X for piano challenge", WHITE)
         text_rect = text.get_rect(center=(WIDTH // 2, HEIGHT - 50))
-        screen.blit(text, text_rect)
+        forest_view.blit(text, text_rect)
     
     if state.current_stage > 1:
-        stage_text = font_medium.render(f"Stage {state.current_stage}", True, WHITE)
-        screen.blit(stage_text, (20, 20))
+        stage_text = render_text(font_medium, f"Stage {state.current_stage}", WHITE)
+        forest_view.blit(stage_text, (20, 20))
 
 def render_piano():
     # Draw full-screen piano background
@@ -324,24 +368,24 @@ def render_piano():
     
     # Draw piano UI elements
     if state.piano_state == STATE_PIANO:
-        text = font_medium.render(f"Stage {state.current_stage} - Phase {state.current_phase}/{state.max_phases}", True, WHITE)
+        text = render_text(font_medium, f"Stage {state.current_stage} - Phase {state.current_phase}/{state.max_phases}", WHITE)
         screen.blit(text, (WIDTH//2 - 150, 20))
         
-        text = font_medium.render("Press ENTER to start", True, WHITE)
+        text = render_text(font_medium, "Press ENTER to start", WHITE)
         screen.blit(text, (WIDTH//2 - 120, 70))
         
-        text = font_small.render(f"Notes: {state.sequence_length}", True, WHITE)
+        text = render_text(font_small, f"Notes: {state.sequence_length}", WHITE)
         screen.blit(text, (WIDTH//2 - 60, 120))
     
     elif state.piano_state == STATE_LISTENING:
-        text = font_medium.render("Listen carefully...", True, WHITE)
+        text = render_text(font_medium, "Listen carefully...", WHITE)
         screen.blit(text, (WIDTH//2 - 120, 50))
     
     elif state.piano_state == STATE_GUESSING:
-        text = font_medium.render(f"Phase {state.current_phase}/{state.max_phases}", True, WHITE)
+        text = render_text(font_medium, f"Phase {state.current_phase}/{state.max_phases}", WHITE)
         screen.blit(text, (WIDTH//2 - 80, 20))
         
-        text = font_medium.render("Repeat the sequence:", True, WHITE)
+        text = render_text(font_medium, "Repeat the sequence:", WHITE)
         screen.blit(text, (WIDTH//2 - 140, 70))
         
         for i in range(len(state.current_sequence)):
@@ -350,30 +394,28 @@ def render_piano():
             pygame.draw.circle(screen, color, (WIDTH//2 - 100 + i * 50, 150), 15)
         
         if len(state.player_sequence) == len(state.current_sequence):
-            text = font_medium.render("Press ENTER to submit", True, (0, 255, 255))
+            text = render_text(font_medium, "Press ENTER to submit", (0, 255, 255))
             screen.blit(text, (WIDTH//2 - 150, 200))
         
-        text = font_small.render("R=Replay | BACKSPACE=Undo", True, YELLOW)
+        text = render_text(font_small, "R=Replay | BACKSPACE=Undo", YELLOW)
         screen.blit(text, (WIDTH//2 - 150, 250))
     
     elif state.piano_state == STATE_FEEDBACK:
-        overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
         if state.player_sequence == state.current_sequence:
-            overlay.fill((0, 255, 0, 180))  # Semi-transparent green
-            text = font_large.render("CORRECT!", True, WHITE)
+            tint(screen, (0, 255, 0), 180)  # Semi-transparent green
+            text = render_text(font_large, "CORRECT!", WHITE)
         else:
-            overlay.fill((255, 0, 0, 180))  # Semi-transparent red
-            text = font_large.render("WRONG!", True, WHITE)
+            tint(screen, (255, 0, 0), 180)  # Semi-transparent red
+            text = render_text(font_large, "WRONG!", WHITE)
         
-        screen.blit(overlay, (0, 0))
         text_rect = text.get_rect(center=(WIDTH//2, HEIGHT//2))
         screen.blit(text, text_rect)
 
 def render_victory():
     screen.fill(PURPLE)
-    text1 = font_large.render("CONGRATULATIONS!", True, YELLOW)
-    text2 = font_medium.render(f"You completed all {state.max_stages} stages!", True, WHITE)
-    text3 = font_medium.render(f"Total phases completed: {state.max_stages * state.max_phases}", True, WHITE)
+    text1 = render_text(font_large, "CONGRATULATIONS!", YELLOW)
+    text2 = render_text(font_medium, f"You completed all {state.max_stages} stages!", WHITE)
+    text3 = render_text(font_medium, f"Total phases completed: {state.max_stages * state.max_phases}", WHITE)
     
     text1_rect = text1.get_rect(center=(WIDTH//2, HEIGHT//2 - 100))
     text2_rect = text2.get_rect(center=(WIDTH//2, HEIGHT//2))
@@ -383,12 +425,25 @@ def render_victory():
     screen.blit(text2, text2_rect)
     screen.blit(text3, text3_rect)
 
-# Main game loop
-running = True
-while running:
-    for event in pygame.event.get():
+def update():
+    """Advance the current stage by one fixed step"""
+    if state.stage_state == STAGE_FOREST:
+        update_forest()
+    elif state.stage_state == STAGE_PIANO:
+        update_piano()
+    elif state.stage_state == VICTORY_SCREEN:
+        update_victory()
+
+def step(events):
+    """Handle one frame's events and update the game, without drawing. False once it quits"""
+    running = True
+    for event in events:
+        key_state.handle(event)
+        profiler.handle(event)
         if event.type == QUIT:
             running = False
+        elif event.type == VIDEOEXPOSE:
+            forest_view.invalidate()
         
         if state.stage_state == STAGE_FOREST:
             handle_forest_events(event)
@@ -398,27 +453,80 @@ while running:
             state.current_stage = 1
             state.current_phase = 1
             state.stage_state = STAGE_FOREST
-            state.x, state.y = 250, 630
+            state.place(250, 630)
             state.generate_sequence()
     
     # Update
-    if state.stage_state == STAGE_FOREST:
-        update_forest()
-    elif state.stage_state == STAGE_PIANO:
-        update_piano()
-    elif state.stage_state == VICTORY_SCREEN:
-        update_victory()
+    profiler.mark("events")
+    for _ in range(timestep.steps()):
+        update()
+    profiler.mark("update")
     
-    # Render
+    return running
+
+def frame_label():
+    """Name of the current stage (and piano state) for the profiler"""
+    if state.stage_state == STAGE_PIANO:
+        return f"STAGE_PIANO/{STATE_NAMES[state.piano_state]}"
+    return STAGE_NAMES[state.stage_state]
+
+def idle_timeout():
+    """ms until the screen changes by itself, or None while something on it moves
+
+    The victory screen and the piano waiting for ENTER are static, so they
+    only need drawing again after input or when their timer runs out.
+    """
+    if state.stage_state == VICTORY_SCREEN:
+        return max(0, state.victory_time + 5000 - clock.get_ticks()) + 1
+    if (state.stage_state == STAGE_PIANO and state.piano_state == STATE_PIANO
+            and state.active_key is None and state.last_wrong_key is None):
+        return IDLE_TIMEOUT
+    return None
+
+def render():
+    """Draw the current stage"""
     if state.stage_state == STAGE_FOREST:
         render_forest()
     elif state.stage_state == STAGE_PIANO:
         render_piano()
     elif state.stage_state == VICTORY_SCREEN:
         render_victory()
+
+def present():
+    """Push the drawn frame to the display"""
+    if state.stage_state == STAGE_FOREST:
+        forest_view.present()
+    else:
+        forest_view.invalidate()
+        pygame.display.flip()
+
+# Main game loop
+def main():
+    running = True
+    idle_drawn = False    # the frame on screen is a static idle screen
+    while running:
+        idle = idle_drawn and not clock.simulated
+        events = inputs.frame_events(clock.events(idle_timeout() if idle else None))
+        profiler.begin(frame_label())
+        running = step(events)
+        if idle and not events and idle_timeout() is not None:
+            # Nothing happened, the idle screen is still up to date
+            continue
+        if not HEADLESS:
+            render()
+            profiler.mark("render")
+            # The forest only updates dirty rects, so the HUD goes through its renderer
+            profiler.draw_hud(forest_view if state.stage_state == STAGE_FOREST else screen)
+            profiler.mark("hud")
+            present()
+            profiler.mark("present")
+        idle_drawn = idle_timeout() is not None
+        clock.tick()
+        profiler.mark("wait")
+        profiler.end()
     
-    pygame.display.flip()
-    clock.tick(60)
+    pygame.quit()
+    sys.exit()
 
-pygame.quit()
-sys.exit()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
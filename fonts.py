@@ -0,0 +1,78 @@
+import time
+import pygame
+
+# Font registry shared by all scenes.
+# pygame.font.SysFont looks the family up in the system font list and opens
+# the font file on every call. Here each family is resolved to a file once
+# and each size is opened once, so drawing code can ask for a font every frame.
+
+
+class FontRegistry:
+    def __init__(self):
+        self.families = {}   # (family, bold, italic) -> (path, fake bold, fake italic)
+        self.fonts = {}      # (family, size, bold, italic) -> Font
+        # Total seconds and number of calls per kind of work
+        self.timings = {"resolve": 0.0, "open": 0.0, "lookup": 0.0}
+        self.counts = {"resolve": 0, "open": 0, "lookup": 0}
+
+    def _record(self, kind, start):
+        self.timings[kind] += time.perf_counter() - start
+        self.counts[kind] += 1
+
+    def resolve(self, family, bold=False, italic=False):
+        """Font file for a family, found the same way SysFont does, searched once"""
+        key = (family, bold, italic)
+        if key not in self.families:
+            start = time.perf_counter()
+            # SysFont hands its choice to the constructor: keep it instead of opening it
+            self.families[key] = pygame.font.SysFont(
+                family, 0, bold, italic, constructor=lambda path, size, fake_bold, fake_italic: (path, fake_bold, fake_italic))
+            self._record("resolve", start)
+        return self.families[key]
+
+    def get(self, family, size, bold=False, italic=False):
+        """Font for a family and size; family None is pygame's default font"""
+        start = time.perf_counter()
+        key = (family, size, bold, italic)
+        font = self.fonts.get(key)
+        if font is None:
+            font = self._open(key)
+        self._record("lookup", start)
+        return font
+
+    def _open(self, key):
+        family, size, bold, italic = key
+        path, fake_bold, fake_italic = self.resolve(family, bold, italic) if family else (None, bold, italic)
+        start = time.perf_counter()
+        font = pygame.font.Font(path, size)
+        font.set_bold(fake_bold)
+        font.set_italic(fake_italic)
+        self._record("open", start)
+        self.fonts[key] = font
+        return font
+
+    def preload(self, family, sizes, bold=False, italic=False):
+        """Open a table of sizes up front so the first frames that draw text don't have to"""
+        for size in sizes:
+            key = (family, size, bold, italic)
+            if key not in self.fonts:
+                self._open(key)
+        return self
+
+    def stats(self):
+        """Calls and average milliseconds per resolve/open/lookup"""
+        return {
+            kind: {
+                "calls": self.counts[kind],
+                "avg_ms": self.timings[kind] * 1000 / self.counts[kind] if self.counts[kind] else 0.0,
+            }
+            for kind in self.timings
+        }
+
+
+# Instance used by every scene
+font_registry = FontRegistry()
+
+
+def get_font(family, size, bold=False, italic=False):
+    return font_registry.get(family, size, bold, italic)
@@ -0,0 +1,155 @@
+import sys
+import threading
+import pygame
+import assets
+from fonts import get_font
+from sim import HEADLESS
+
+# Background asset loading.
+# A scene declares the assets it needs, the worker thread decodes them and
+# the main thread keeps drawing a progress screen and pumping events, so the
+# window stays responsive while PNGs and MP3s decode.
+
+BG_COLOR = (20, 20, 30)
+BAR_COLOR = (200, 200, 230)
+TEXT_COLOR = (240, 240, 255)
+
+
+class AssetLoader:
+    def __init__(self):
+        self.jobs = []        # (label, func, args, kwargs)
+        self.results = {}
+        self.errors = {}
+        self.loaded = 0
+        self.thread = None
+
+    def add(self, label, func, *args, **kwargs):
+        """Declare an asset: func(*args, **kwargs) runs on the worker thread"""
+        self.jobs.append((label, func, args, kwargs))
+        return self
+
+    def image(self, label, name, size=None, **kwargs):
+        return self.add(label, assets.load_image, name, size, **kwargs)
+
+    def overlay(self, label, name, size, reference=None, **kwargs):
+        return self.add(label, assets.load_overlay, name, size, reference, **kwargs)
+
+    def atlas(self, label, name, build):
+        return self.add(label, assets.load_atlas, name, build)
+
+    def sound(self, label, name):
+        return self.add(label, assets.load_sound, name)
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self):
+        for label, func, args, kwargs in self.jobs:
+            try:
+                self.results[label] = func(*args, **kwargs)
+            except Exception as e:
+                self.errors[label] = e
+            self.loaded += 1
+
+    @property
+    def progress(self):
+        return self.loaded / len(self.jobs) if self.jobs else 1.0
+
+    def done(self):
+        return self.loaded >= len(self.jobs)
+
+    def get(self, label):
+        """Result of a job, re-raising the error if it failed to load"""
+        if label in self.errors:
+            raise self.errors[label]
+        return self.results[label]
+
+    def show_progress(self, screen, fps=60):
+        """Draw a progress screen until every declared asset is loaded"""
+        if self.thread is None:
+            self.start()
+        if HEADLESS:
+            # Nothing to show, just wait for the worker
+            self.thread.join()
+            return
+        clock = pygame.time.Clock()
+        font = get_font(None, 36)
+        width, height = screen.get_size()
+        bar = pygame.Rect(width // 4, height // 2, width // 2, 20)
+
+        while not self.done():
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    pygame.quit()
+                    sys.exit()
+
+            screen.fill(BG_COLOR)
+            text = font.render("Loading...", True, TEXT_COLOR)
+            screen.blit(text, (width // 2 - text.get_width() // 2, bar.y - 50))
+            pygame.draw.rect(screen, BAR_COLOR, bar, 2)
+            filled = bar.inflate(-6, -6)
+            filled.width = int(filled.width * self.progress)
+            pygame.draw.rect(screen, BAR_COLOR, filled)
+            pygame.display.flip()
+            clock.tick(fps)
+
+        self.thread.join()
+
+
+class AssetGroup:
+    """Assets of one stage: loaded on first entry, evictable when leaving"""
+
+    def __init__(self):
+        self.declared = []    # (loader method, args, kwargs)
+        self.loader = None
+
+    def image(self, label, name, size=None, **kwargs):
+        self.declared.append(("image", (label, name, size), kwargs))
+        return self
+
+    def overlay(self, label, name, size, reference=None, **kwargs):
+        self.declared.append(("overlay", (label, name, size, reference), kwargs))
+        return self
+
+    def atlas(self, label, name, build):
+        self.declared.append(("atlas", (label, name, build), {}))
+        return self
+
+    def sound(self, label, name):
+        self.declared.append(("sound", (label, name), {}))
+        return self
+
+    def prefetch(self):
+        """Start loading in the background, e.g. when the player nears the stage"""
+        if self.loader is None:
+            self.loader = AssetLoader()
+            for method, args, kwargs in self.declared:
+                getattr(self.loader, method)(*args, **kwargs)
+            self.loader.start()
+        return self.loader
+
+    def require(self, screen):
+        """Make sure the group is loaded, showing progress until it is"""
+        self.prefetch().show_progress(screen)
+        return self
+
+    def loaded(self):
+        return self.loader is not None and self.loader.done()
+
+    def get(self, label):
+        return self.loader.get(label)
+
+    def unload(self):
+        """Drop the group's assets from the cache so their memory can be freed"""
+        if self.loader is None:
+            return
+        self.loader.thread.join()
+        for method, args, _ in self.declared:
+            if method in ("image", "overlay", "atlas"):
+                try:
+                    assets.evict(args[1])
+                except FileNotFoundError:
+                    pass
+        self.loader = None
@@ -2,6 +2,16 @@ import pygame
 import sys
 import random
 from pygame.locals import *
+import assets
+from atlas import Atlas
+from loader import AssetGroup
+from sim import HEADLESS, IDLE_TIMEOUT, clock, key_state, timestep
+from replay import inputs
+from render import DirtyRenderer, LayerCache, tint
+from fonts import get_font
+from text_cache import render as render_text
+from synth import note_sound
+from profiler import profiler
 
 # Initialize pygame
 pygame.init()
@@ -33,37 +43,73 @@ STATE_LISTENING = 2
 STATE_GUESSING = 3
 STATE_FEEDBACK = 4
 
-# Load images
+# State names shown by the profiler
+STAGE_NAMES = {STAGE_FOREST: "STAGE_FOREST", STAGE_PIANO: "STAGE_PIANO", VICTORY_SCREEN: "VICTORY_SCREEN"}
+STATE_NAMES = {STATE_PIANO: "STATE_PIANO", STATE_LISTENING: "STATE_LISTENING",
+               STATE_GUESSING: "STATE_GUESSING", STATE_FEEDBACK: "STATE_FEEDBACK"}
+
+# Piano configuration
+piano_notes = [
+    {'key': K_a, 'name': 'A', 'sound': None},
+    {'key': K_b, 'name': 'B', 'sound': None},
+    {'key': K_c, 'name': 'C', 'sound': None},
+    {'key': K_d, 'name': 'D', 'sound': None},
+    {'key': K_e, 'name': 'E', 'sound': None},
+    {'key': K_f, 'name': 'F', 'sound': None},
+    {'key': K_g, 'name': 'G', 'sound': None}
+]
+
+# Assets grouped by stage. A group is decoded on a worker thread when its
+# stage is first entered (the piano is prefetched once the player reaches
+# the piano prompt) and dropped again once the stage is left for good.
+piano_key_files = {K_a: "piano a.png", K_b: "piano b.png", K_c: "piano c.png", K_d: "piano d.png",
+                   K_e: "piano e.png", K_f: "piano f.png", K_g: "piano g.png"}
+sound_files = ['A3.mp3', 'B3.mp3', 'C3.mp3', 'D3.mp3', 'E3.mp3', 'F3.mp3', 'G3.mp3']
+
+def build_character_atlas():
+    """Walk cycle frames, labelled (direction, frame)"""
+    sheet = Atlas(rle=True)
+    for i in range(4):
+        sheet.add(('right', i), assets.load_image(f"pic{i + 1}.gif", (100, 130)))
+        sheet.add(('left', i), assets.load_image(f"pic{i + 1}.gif", (100, 130), flip=True))
+        assets.evict(f"pic{i + 1}.gif")
+    return sheet.pack()
+
+def build_key_atlas():
+    """Key highlights, labelled by key and drawn at their screen position"""
+    sheet = Atlas()
+    for key, name in piano_key_files.items():
+        # Cropped to the highlighted key, where the image differs from piano.png
+        overlay, rect = assets.load_overlay(name, (WIDTH, HEIGHT), "piano.png", mapped=True)
+        sheet.add(key, overlay, rect.topleft, alpha=180)  # Semi-transparent (0-255)
+        assets.evict(name)
+    return sheet.pack()
+
+forest_assets = AssetGroup()
+forest_assets.image("forest_bg", "scene3.png", (WIDTH, HEIGHT), mapped=True)
+forest_assets.atlas("characters", "characters", build_character_atlas)
+
+piano_assets = AssetGroup()
+piano_assets.image("piano_bg", "piano.png", (WIDTH, HEIGHT), alpha=True, mapped=True)
+piano_assets.atlas("piano_keys", "piano_keys", build_key_atlas)
+for note, sound_file in zip(piano_notes, sound_files):
+    piano_assets.sound(note['name'], f"piano notes/{sound_file}")
+
+victory_assets = AssetGroup()
+victory_assets.image("victory_bg", "mysterybg.png", (WIDTH, HEIGHT), mapped=True)
+
+piano_bg = None
+piano_keys = None
+victory_bg = None
+
+# Load forest images
+forest_assets.require(screen)
 try:
     # Forest background
-    forest_bg = pygame.image.load("C:\\Users\\USER\\Documents\\GitHub\\FragmentsOfMaya\\fragments\\scene3.png").convert()
-    forest_bg = pygame.transform.scale(forest_bg, (WIDTH, HEIGHT))
+    forest_bg = forest_assets.get("forest_bg")
     
     # Character animations
-    character_images = {
-        'right': [pygame.transform.scale(pygame.image.load(f"C:\\Users\\USER\\Documents\\GitHub\\FragmentsOfMaya\\fragments\\pic{i}.gif"), (100, 130)) for i in range(1, 5)],
-        'left': [pygame.transform.flip(pygame.transform.scale(pygame.image.load(f"C:\\Users\\USER\\Documents\\GitHub\\FragmentsOfMaya\\fragments\\pic{i}.gif"), (100, 130)), True, False) for i in range(1, 5)]
-    }
-    
-    # Piano images - now with transparency
-    piano_bg = pygame.image.load("C:\\Users\\USER\\Documents\\GitHub\\FragmentsOfMaya\\fragments\\piano.png").convert_alpha()
-    piano_bg = pygame.transform.scale(piano_bg, (WIDTH, HEIGHT))
-    
-    # Make piano keys semi-transparent
-    piano_key_bgs = {
-        K_a: pygame.image.load("C:\\Users\\USER\\Documents\\GitHub\\FragmentsOfMaya\\fragments\\piano a.png").convert_alpha(),
-        K_b: pygame.image.load("C:\\Users\\USER\\Documents\\GitHub\\FragmentsOfMaya\\fragments\\piano b.png").convert_alpha(),
-        K_c: pygame.image.load("C:\\Users\\USER\\Documents\\GitHub\\FragmentsOfMaya\\fragments\\piano c.png").convert_alpha(),
-        K_d: pygame.image.load("C:\\Users\\USER\\Documents\\GitHub\\FragmentsOfMaya\\fragments\\piano d.png").convert_alpha(),
-        K_e: pygame.image.load("C:\\Users\\USER\\Documents\\GitHub\\FragmentsOfMaya\\fragments\\piano e.png").convert_alpha(),
-        K_f: pygame.image.load("C:\\Users\\USER\\Documents\\GitHub\\FragmentsOfMaya\\fragments\\piano f.png").convert_alpha(),
-        K_g: pygame.image.load("C:\\Users\\USER\\Documents\\GitHub\\FragmentsOfMaya\\fragments\\piano g.png").convert_alpha()
-    }
-    
-    # Scale key images and set transparency
-    for key in piano_key_bgs:
-        piano_key_bgs[key] = pygame.transform.scale(piano_key_bgs[key], (WIDTH, HEIGHT))
-        piano_key_bgs[key].set_alpha(180)  # Semi-transparent (0-255)
+    characters = forest_assets.get("characters")
 
 except Exception as e:
     print(f"Error loading images: {e}")
@@ -81,32 +127,11 @@ except Exception as e:
         pygame.draw.line(character_images['right'][i], BLACK, (50, 45), (50, 90), 3)
         character_images['left'][i].blit(pygame.transform.flip(character_images['right'][i], True, False), (0, 0))
     
-    piano_bg = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
-    piano_bg.fill((30, 30, 40, 180))  # Semi-transparent
-    piano_key_bgs = {key: pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA) for key in [K_a, K_b, K_c, K_d, K_e, K_f, K_g]}
-    for key in piano_key_bgs:
-        piano_key_bgs[key].fill((random.randint(50, 200), random.randint(50, 200), random.randint(50, 200), 180))
-
-# Piano configuration
-piano_notes = [
-    {'key': K_a, 'name': 'A', 'sound': None},
-    {'key': K_b, 'name': 'B', 'sound': None},
-    {'key': K_c, 'name': 'C', 'sound': None},
-    {'key': K_d, 'name': 'D', 'sound': None},
-    {'key': K_e, 'name': 'E', 'sound': None},
-    {'key': K_f, 'name': 'F', 'sound': None},
-    {'key': K_g, 'name': 'G', 'sound': None}
-]
-
-# Load sounds
-try:
-    sound_files = ['A3.mp3', 'B3.mp3', 'C3.mp3', 'D3.mp3', 'E3.mp3', 'F3.mp3', 'G3.mp3']
-    for i, note in enumerate(piano_notes):
-        note['sound'] = pygame.mixer.Sound(f"C:\\Users\\USER\\Documents\\GitHub\\FragmentsOfMaya\\fragments\\piano notes\\{sound_files[i]}")
-except Exception as e:
-    print(f"Error loading sounds: {e}")
-    for note in piano_notes:
-        note['sound'] = pygame.mixer.Sound(buffer=bytearray(100))
+    characters = Atlas()
+    for direction, frames in character_images.items():
+        for i, frame in enumerate(frames):
+            characters.add((direction, i), frame)
+    characters.pack()
 
 class GameState:
     def __init__(self):
@@ -118,6 +143,7 @@ class GameState:
         
         # Forest
         self.x, self.y = 250, 630
+        self.prev_x, self.prev_y = self.x, self.y  # before the last update, for interpolation
         self.y_velocity = 0
         self.is_jumping = False
         self.current_img = 0
@@ -144,6 +170,15 @@ class GameState:
         # Victory
         self.victory_time = 0
 
+    def place(self, x, y):
+        """Move the player at once, without interpolating from the old spot"""
+        self.x = self.prev_x = x
+        self.y = self.prev_y = y
+
+    def draw_position(self):
+        """Where to draw the player, between its last two updates"""
+        return timestep.interpolate(self.prev_x, self.x), timestep.interpolate(self.prev_y, self.y)
+
     def generate_sequence(self):
         self.sequence_length = 3 + self.current_stage
         self.current_sequence = random.sample([note['name'] for note in piano_notes], min(7, self.sequence_length))
@@ -151,10 +186,77 @@ class GameState:
         self.current_note_index = 0
 
 state = GameState()
-clock = pygame.time.Clock()
-font_large = pygame.font.Font(None, 120)
-font_medium = pygame.font.Font(None, 48)
-font_small = pygame.font.Font(None, 36)
+forest_view = DirtyRenderer(screen)
+font_large = get_font(None, 120)
+font_medium = get_font(None, 48)
+font_small = get_font(None, 36)
+
+def load_piano_assets():
+    global piano_bg, piano_keys
+    if piano_bg is not None:
+        return
+    piano_assets.require(screen)
+    
+    # Load piano images
+    try:
+        # Piano images - now with transparency
+        piano_bg = piano_assets.get("piano_bg")
+        
+        # Semi-transparent key highlights
+        piano_keys = piano_assets.get("piano_keys")
+    except Exception as e:
+        print(f"Error loading images: {e}")
+        piano_bg = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
+        piano_bg.fill((30, 30, 40, 180))  # Semi-transparent
+        piano_keys = Atlas()
+        for key in [K_a, K_b, K_c, K_d, K_e, K_f, K_g]:
+            overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
+            overlay.fill((random.randint(50, 200), random.randint(50, 200), random.randint(50, 200), 180))
+            piano_keys.add(key, overlay)
+        piano_keys.pack()
+    
+    # Load sounds
+    try:
+        for note in piano_notes:
+            note['sound'] = piano_assets.get(note['name'])
+    except Exception as e:
+        print(f"Error loading sounds: {e}, synthesizing them")
+        for note in piano_notes:
+            note['sound'] = note_sound(f"{note['name']}3")
+
+def unload_piano_assets():
+    global piano_bg, piano_keys
+    piano_bg = None
+    piano_keys = None
+    piano_backdrop.invalidate()
+    for note in piano_notes:
+        note['sound'] = None
+    piano_assets.unload()
+
+def load_victory_assets():
+    global victory_bg
+    victory_assets.require(screen)
+    try:
+        victory_bg = victory_assets.get("victory_bg")
+    except Exception as e:
+        print(f"Error loading victory background: {e}")
+        victory_bg = None
+
+def unload_victory_assets():
+    global victory_bg
+    victory_bg = None
+    victory_assets.unload()
+
+def enter_stage(stage):
+    """Switch stage, loading its assets on first entry and dropping finished ones"""
+    if stage == STAGE_PIANO:
+        load_piano_assets()
+    elif stage == VICTORY_SCREEN:
+        unload_piano_assets()
+        load_victory_assets()
+    elif stage == STAGE_FOREST and state.stage_state == VICTORY_SCREEN:
+        unload_victory_assets()
+    state.stage_state = stage
 
 def play_note(note_name, show_visual=True):
     """Play a note sound and optionally show the key press visually"""
@@ -163,7 +265,7 @@ def play_note(note_name, show_visual=True):
             note['sound'].play()
             if show_visual:
                 state.active_key = note['key']
-                state.key_pressed_time = pygame.time.get_ticks()
+                state.key_pressed_time = clock.get_ticks()
             return note['key']
     return None
 
@@ -171,7 +273,7 @@ def play_sequence():
     """Start playing the sequence of notes"""
     state.sequence_playing = True
     state.current_note_index = 0
-    state.note_time = pygame.time.get_ticks()
+    state.note_time = clock.get_ticks()
 
 def handle_forest_events(event):
     if event.type == KEYDOWN:
@@ -179,44 +281,45 @@ def handle_forest_events(event):
             state.is_jumping = True
             state.y_velocity = -15
         elif event.key == K_x and state.show_message:
-            state.stage_state = STAGE_PIANO
+            enter_stage(STAGE_PIANO)
 
 def handle_piano_events(event):
     if event.type == KEYDOWN:
         if event.key == K_ESCAPE:
-            state.stage_state = STAGE_FOREST
+            enter_stage(STAGE_FOREST)
         elif event.key == K_RETURN:
             if state.piano_state == STATE_PIANO:
                 play_sequence()
                 state.piano_state = STATE_LISTENING
             elif state.piano_state == STATE_GUESSING and len(state.player_sequence) == len(state.current_sequence):
                 state.piano_state = STATE_FEEDBACK
-                state.feedback_time = pygame.time.get_ticks()
+                state.feedback_time = clock.get_ticks()
         elif event.key == K_BACKSPACE and state.piano_state == STATE_GUESSING:
             if state.player_sequence:
                 state.player_sequence.pop()
-        elif event.key == K_r and state.piano_state == STATE_GUESSING and pygame.time.get_ticks() - state.replay_cooldown > 1000:
+        elif event.key == K_r and state.piano_state == STATE_GUESSING and clock.get_ticks() - state.replay_cooldown > 1000:
             play_sequence()
             state.piano_state = STATE_LISTENING
-            state.replay_cooldown = pygame.time.get_ticks()
+            state.replay_cooldown = clock.get_ticks()
         elif event.key in {note['key'] for note in piano_notes} and state.piano_state != STATE_FEEDBACK:
             note = next(n for n in piano_notes if n['key'] == event.key)
             note['sound'].play()
             state.active_key = event.key
-            state.key_pressed_time = pygame.time.get_ticks()
+            state.key_pressed_time = clock.get_ticks()
             if state.piano_state == STATE_GUESSING:
                 state.player_sequence.append(note['name'])
                 if len(state.player_sequence) <= len(state.current_sequence):
                     if note['name'] != state.current_sequence[len(state.player_sequence)-1]:
                         state.last_wrong_key = event.key
-                        state.wrong_key_time = pygame.time.get_ticks()
+                        state.wrong_key_time = clock.get_ticks()
     
     if event.type == KEYUP and event.key in {note['key'] for note in piano_notes}:
         if state.active_key == event.key:
             state.active_key = None
 
 def update_forest():
-    keys = pygame.key.get_pressed()
+    state.prev_x, state.prev_y = state.x, state.y
+    keys = key_state.get_pressed()
     
     if keys[K_LEFT] or keys[K_a]:
         state.x = max(-100, state.x - 5)
@@ -225,9 +328,9 @@ def update_forest():
         state.x = min(WIDTH, state.x + 5)
         state.direction = 'right'
     
-    if (keys[K_LEFT] or keys[K_RIGHT] or keys[K_a] or keys[K_d]) and pygame.time.get_ticks() - state.last_switch > 300:
+    if (keys[K_LEFT] or keys[K_RIGHT] or keys[K_a] or keys[K_d]) and clock.get_ticks() - state.last_switch > 300:
         state.current_img = (state.current_img + 1) % 4
-        state.last_switch = pygame.time.get_ticks()
+        state.last_switch = clock.get_ticks()
     
     if state.is_jumping:
         state.y += state.y_velocity
@@ -237,9 +340,13 @@ def update_forest():
             state.is_jumping = False
     
     state.show_message = (550 <= state.x <= 650) and (580 <= state.y <= 680)
+    
+    # Start decoding the piano while the player reads the prompt
+    if state.show_message:
+        piano_assets.prefetch()
 
 def update_piano():
-    current_time = pygame.time.get_ticks()
+    current_time = clock.get_ticks()
     
     if state.piano_state == STATE_LISTENING and state.sequence_playing:
         if current_time - state.note_time > 500:
@@ -261,7 +368,7 @@ def update_piano():
                     if state.current_stage < state.max_stages:
                         state.current_stage += 1
                     else:
-                        state.stage_state = VICTORY_SCREEN
+                        enter_stage(VICTORY_SCREEN)
                         state.victory_time = current_time
             state.generate_sequence()
             state.piano_state = STATE_PIANO
@@ -272,39 +379,46 @@ def update_piano():
         state.active_key = None
 
 def update_victory():
-    if pygame.time.get_ticks() - state.victory_time > 5000:
+    if clock.get_ticks() - state.victory_time > 5000:
         state.current_stage = 1
         state.current_phase = 1
-        state.stage_state = STAGE_FOREST
-        state.x, state.y = 250, 630
+        enter_stage(STAGE_FOREST)
+        state.place(250, 630)
 
 def render_forest():
-    screen.blit(forest_bg, (0, 0))
-    screen.blit(character_images[state.direction][state.current_img], (state.x, state.y))
+    # Only the sprite and label rects are redrawn over the background
+    forest_view.begin(forest_bg)
+    characters.blit(forest_view, (state.direction, state.current_img), state.draw_position())
     
     if state.show_message:
-        text = font_small.render("Press X for piano challenge", True, WHITE)
-        screen.blit(text, (WIDTH//2 - text.get_width()//2, HEIGHT - 50))
+        text = render_text(font_small, "Press X for piano challenge", WHITE)
+        forest_view.blit(text, (WIDTH//2 - text.get_width()//2, HEIGHT - 50))
     
     if state.current_stage > 1:
-        text = font_medium.render(f"Stage {state.current_stage}", True, WHITE)
-        screen.blit(text, (20, 20))
+        text = render_text(font_medium, f"Stage {state.current_stage}", WHITE)
+        forest_view.blit(text, (20, 20))
 
-def render_piano():
+def compose_piano_backdrop(surface, forest, piano):
     # 1. Draw forest background first (shows through transparency)
-    screen.blit(forest_bg, (0, 0))
+    surface.blit(forest, (0, 0))
     
     # 2. Draw piano background with proper transparency
-    screen.blit(piano_bg, (0, 0))
+    surface.blit(piano, (0, 0))
     
     # 3. Add semi-transparent overlay for better UI visibility
-    overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
+    overlay = pygame.Surface(surface.get_size(), pygame.SRCALPHA)
     overlay.fill((30, 30, 40, 120))  # Semi-transparent dark blue
-    screen.blit(overlay, (0, 0))
+    surface.blit(overlay, (0, 0))
+
+piano_backdrop = LayerCache(compose_piano_backdrop)
+
+def render_piano():
+    # 1-3. Forest, piano and dimming overlay, composited once
+    screen.blit(piano_backdrop.get((WIDTH, HEIGHT), forest_bg, piano_bg), (0, 0))
     
     # 4. Draw active piano key when pressed (only during player's turn, not during listening)
-    if state.piano_state != STATE_LISTENING and state.active_key and pygame.time.get_ticks() - state.key_pressed_time < 500:
-        screen.blit(piano_key_bgs[state.active_key], (0, 0))
+    if state.piano_state != STATE_LISTENING and state.active_key and clock.get_ticks() - state.key_pressed_time < 500:
+        piano_keys.blit(screen, state.active_key)
     
     # 5. UI Elements (non-transparent)
     if state.piano_state == STATE_PIANO:
@@ -314,11 +428,11 @@ def render_piano():
             f"Notes: {state.sequence_length}"
         ]
         for i, text in enumerate(texts):
-            rendered = font_medium.render(text, True, WHITE)
+            rendered = render_text(font_medium, text, WHITE)
             screen.blit(rendered, (WIDTH//2 - rendered.get_width()//2, 20 + i * 50))
     
     elif state.piano_state == STATE_LISTENING:
-        text = font_medium.render("Listen carefully...", True, WHITE)
+        text = render_text(font_medium, "Listen carefully...", WHITE)
         screen.blit(text, (WIDTH//2 - text.get_width()//2, 50))
     
     elif state.piano_state == STATE_GUESSING:
@@ -334,33 +448,27 @@ def render_piano():
             "R=Replay | BACKSPACE=Undo"
         ]
         for i, text in enumerate(texts):
-            rendered = font_medium.render(text, True, WHITE) if i != 2 else font_small.render(text, True, YELLOW)
+            rendered = render_text(font_medium, text, WHITE) if i != 2 else render_text(font_small, text, YELLOW)
             screen.blit(rendered, (WIDTH//2 - rendered.get_width()//2, 20 + i * 70))
         
         if len(state.player_sequence) == len(state.current_sequence):
-            text = font_medium.render("Press ENTER to submit", True, (0, 255, 255))
+            text = render_text(font_medium, "Press ENTER to submit", (0, 255, 255))
             screen.blit(text, (WIDTH//2 - text.get_width()//2, 200))
     
     elif state.piano_state == STATE_FEEDBACK:
-        overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
-        overlay.fill((0, 255, 0, 180) if state.player_sequence == state.current_sequence else (255, 0, 0, 180))
-        screen.blit(overlay, (0, 0))
+        tint(screen, (0, 255, 0) if state.player_sequence == state.current_sequence else (255, 0, 0), 180)
         
-        text = font_large.render("CORRECT!" if state.player_sequence == state.current_sequence else "WRONG!", True, WHITE)
+        text = render_text(font_large, "CORRECT!" if state.player_sequence == state.current_sequence else "WRONG!", WHITE)
         screen.blit(text, (WIDTH//2 - text.get_width()//2, HEIGHT//2 - 50))
         
         if state.player_sequence != state.current_sequence:
-            text = font_medium.render(f"Sequence: {'-'.join(state.current_sequence)}", True, WHITE)
+            text = render_text(font_medium, f"Sequence: {'-'.join(state.current_sequence)}", WHITE)
             screen.blit(text, (WIDTH//2 - text.get_width()//2, HEIGHT//2 + 50))
 
 def render_victory():
-    try:
-        # Load victory background with corrected path
-        victory_bg = pygame.image.load("C:\\Users\\USER\\Documents\\GitHub\\FragmentsOfMaya\\fragments\\mysterybg.png").convert()
-        victory_bg = pygame.transform.scale(victory_bg, (WIDTH, HEIGHT))
+    if victory_bg is not None:
         screen.blit(victory_bg, (0, 0))
-    except Exception as e:
-        print(f"Error loading victory background: {e}")
+    else:
         # Fallback for victory screen
         screen.fill(PURPLE)  # Fallback to purple if image can't be loaded
     
@@ -370,15 +478,28 @@ def render_victory():
         f"But don't get too excited, this is just the beginning."
     ]
     for i, text in enumerate(texts):
-        rendered = font_large.render(text, True, YELLOW) if i == 0 else font_medium.render(text, True, WHITE)
+        rendered = render_text(font_large, text, YELLOW) if i == 0 else render_text(font_medium, text, WHITE)
         screen.blit(rendered, (WIDTH//2 - rendered.get_width()//2, HEIGHT//2 - 100 + i * 100))
 
-# Main loop
-running = True
-while running:
-    for event in pygame.event.get():
+def update():
+    """Advance the current stage by one fixed step"""
+    if state.stage_state == STAGE_FOREST:
+        update_forest()
+    elif state.stage_state == STAGE_PIANO:
+        update_piano()
+    elif state.stage_state == VICTORY_SCREEN:
+        update_victory()
+
+def step(events):
+    """Handle one frame's events and update the game, without drawing. False once it quits"""
+    running = True
+    for event in events:
+        key_state.handle(event)
+        profiler.handle(event)
         if event.type == QUIT:
             running = False
+        elif event.type == VIDEOEXPOSE:
+            forest_view.invalidate()
         
         if state.stage_state == STAGE_FOREST:
             handle_forest_events(event)
@@ -387,26 +508,79 @@ while running:
         elif state.stage_state == VICTORY_SCREEN and event.type == KEYDOWN:
             state.current_stage = 1
             state.current_phase = 1
-            state.stage_state = STAGE_FOREST
+            enter_stage(STAGE_FOREST)
     
     # Update
-    if state.stage_state == STAGE_FOREST:
-        update_forest()
-    elif state.stage_state == STAGE_PIANO:
-        update_piano()
-    elif state.stage_state == VICTORY_SCREEN:
-        update_victory()
+    profiler.mark("events")
+    for _ in range(timestep.steps()):
+        update()
+    profiler.mark("update")
     
-    # Render
+    return running
+
+def frame_label():
+    """Name of the current stage (and piano state) for the profiler"""
+    if state.stage_state == STAGE_PIANO:
+        return f"STAGE_PIANO/{STATE_NAMES[state.piano_state]}"
+    return STAGE_NAMES[state.stage_state]
+
+def idle_timeout():
+    """ms until the screen changes by itself, or None while something on it moves
+
+    The victory screen and the piano waiting for ENTER are static, so they
+    only need drawing again after input or when their timer runs out.
+    """
+    if state.stage_state == VICTORY_SCREEN:
+        return max(0, state.victory_time + 5000 - clock.get_ticks()) + 1
+    if (state.stage_state == STAGE_PIANO and state.piano_state == STATE_PIANO
+            and state.active_key is None and state.last_wrong_key is None):
+        return IDLE_TIMEOUT
+    return None
+
+def render():
+    """Draw the current stage"""
     if state.stage_state == STAGE_FOREST:
         render_forest()
     elif state.stage_state == STAGE_PIANO:
         render_piano()
     elif state.stage_state == VICTORY_SCREEN:
         render_victory()
+
+def present():
+    """Push the drawn frame to the display"""
+    if state.stage_state == STAGE_FOREST:
+        forest_view.present()
+    else:
+        forest_view.invalidate()
+        pygame.display.flip()
+
+# Main loop
+def main():
+    running = True
+    idle_drawn = False    # the frame on screen is a static idle screen
+    while running:
+        idle = idle_drawn and not clock.simulated
+        events = inputs.frame_events(clock.events(idle_timeout() if idle else None))
+        profiler.begin(frame_label())
+        running = step(events)
+        if idle and not events and idle_timeout() is not None:
+            # Nothing happened, the idle screen is still up to date
+            continue
+        if not HEADLESS:
+            render()
+            profiler.mark("render")
+            # The forest only updates dirty rects, so the HUD goes through its renderer
+            profiler.draw_hud(forest_view if state.stage_state == STAGE_FOREST else screen)
+            profiler.mark("hud")
+            present()
+            profiler.mark("present")
+        idle_drawn = idle_timeout() is not None
+        clock.tick()
+        profiler.mark("wait")
+        profiler.end()
     
-    pygame.display.flip()
-    clock.tick(60)
+    pygame.quit()
+    sys.exit()
 
-pygame.quit()
-sys.exit()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
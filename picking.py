@@ -0,0 +1,48 @@
+# Uniform-grid spatial hash for picking objects under the mouse.
+# Every object is listed in the grid cells its bounding rect overlaps, so a
+# click only has to test the few objects sharing the clicked cell instead of
+# every object on screen.
+
+CELL_SIZE = 64
+
+
+class SpatialHash:
+    def __init__(self, cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}   # (col, row) -> set of objects overlapping that cell
+        self.items = {}   # object -> cells it is listed in
+
+    def _cells(self, rect):
+        x, y, width, height = rect
+        size = self.cell_size
+        return [(col, row)
+                for col in range(int(x // size), int((x + width) // size) + 1)
+                for row in range(int(y // size), int((y + height) // size) + 1)]
+
+    def insert(self, item, rect):
+        """Add an object, or move it if it is already in the grid"""
+        cells = self._cells(rect)
+        old = self.items.get(item)
+        if old == cells:
+            return
+        if old is not None:
+            self.remove(item)
+        for cell in cells:
+            self.cells.setdefault(cell, set()).add(item)
+        self.items[item] = cells
+
+    def remove(self, item):
+        for cell in self.items.pop(item, ()):
+            bucket = self.cells[cell]
+            bucket.discard(item)
+            if not bucket:
+                del self.cells[cell]
+
+    def query_point(self, point):
+        """Objects whose bounds may contain the point (still needs a precise test)"""
+        size = self.cell_size
+        return self.cells.get((int(point[0] // size), int(point[1] // size)), set())
+
+    def clear(self):
+        self.cells.clear()
+        self.items.clear()
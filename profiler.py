@@ -0,0 +1,129 @@
+import atexit
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+import pygame
+from fonts import get_font
+from text_cache import render as render_text
+
+# Per-phase frame timing.
+# FRAGMENTS_PROFILE=1 times every frame of a scene, split into the phases
+# the main loop marks (events, update, render, hud, present, wait), and
+# keeps the last ROLLING_FRAMES samples of each phase per game state, e.g.
+# STAGE_PIANO/STATE_FEEDBACK. F3 toggles a HUD with the p50/p99 of the
+# current state. FRAGMENTS_PROFILE_OUT=frames.csv (or .json) also writes
+# every frame's samples when the game exits.
+
+OUT_PATH = os.environ.get("FRAGMENTS_PROFILE_OUT")
+ENABLED = os.environ.get("FRAGMENTS_PROFILE") == "1" or bool(OUT_PATH)
+
+ROLLING_FRAMES = 600
+HUD_KEY = pygame.K_F3
+HUD_REFRESH = 15        # frames between HUD text updates
+HUD_COLOR = (230, 230, 140)
+HUD_BACKGROUND = (0, 0, 0, 160)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+class FrameProfiler:
+    def __init__(self, scene, enabled=ENABLED, out_path=OUT_PATH):
+        self.scene = scene
+        self.enabled = enabled
+        self.out_path = out_path
+        self.history = {}     # state label -> {phase: deque of ns}
+        self.frames = []      # (frame, label, {phase: ns}) for the export
+        self.frame = 0
+        self.label = None
+        self.phases = None
+        self.last = 0
+        self.show_hud = False
+        self.hud_panel = None
+        if enabled and out_path:
+            atexit.register(self.export)
+
+    def begin(self, label):
+        """Start timing a frame spent in the given game state"""
+        if not self.enabled:
+            return
+        self.label = label
+        self.phases = {}
+        self.last = time.perf_counter_ns()
+
+    def mark(self, phase):
+        """End a phase: the time since the previous mark goes to it"""
+        if not self.enabled or self.phases is None:
+            return
+        now = time.perf_counter_ns()
+        self.phases[phase] = self.phases.get(phase, 0) + now - self.last
+        self.last = now
+
+    def end(self):
+        """Finish the frame and file its phase times under its state"""
+        if not self.enabled or self.phases is None:
+            return
+        history = self.history.setdefault(self.label, {})
+        for phase, ns in self.phases.items():
+            history.setdefault(phase, deque(maxlen=ROLLING_FRAMES)).append(ns)
+        history.setdefault("frame", deque(maxlen=ROLLING_FRAMES)).append(sum(self.phases.values()))
+        if self.out_path:
+            self.frames.append((self.frame, self.label, self.phases))
+        self.frame += 1
+        self.phases = None
+
+    def handle(self, event):
+        if self.enabled and event.type == pygame.KEYDOWN and event.key == HUD_KEY:
+            self.show_hud = not self.show_hud
+
+    def stats(self, label):
+        """{phase: (p50 ms, p99 ms)} over the recent frames of a state"""
+        result = {}
+        for phase, samples in self.history.get(label, {}).items():
+            values = sorted(samples)
+            result[phase] = (percentile(values, 0.5) / 1e6, percentile(values, 0.99) / 1e6)
+        return result
+
+    def draw_hud(self, target):
+        """Draw the HUD; target is the screen or anything with the same blit()"""
+        if not self.enabled or not self.show_hud:
+            return
+        if self.frame % HUD_REFRESH == 0 or self.hud_panel is None:
+            lines = [f"{self.scene}  {self.label}  (p50 / p99 ms)"]
+            for phase, (p50, p99) in self.stats(self.label).items():
+                lines.append(f"{phase:<8} {p50:6.2f} {p99:6.2f}")
+            font = get_font(None, 22)
+            height = font.get_linesize()
+            # One translucent panel, so it also works through a dirty-rect renderer
+            self.hud_panel = pygame.Surface((300, height * len(lines) + 10), pygame.SRCALPHA)
+            self.hud_panel.fill(HUD_BACKGROUND)
+            for i, line in enumerate(lines):
+                self.hud_panel.blit(render_text(font, line, HUD_COLOR), (5, 5 + i * height))
+        target.blit(self.hud_panel, (5, 5))
+
+    def export(self):
+        """Write every frame's phase times (ms) to OUT_PATH as CSV or JSON"""
+        phases = []
+        for _, _, times in self.frames:
+            phases += [phase for phase in times if phase not in phases]
+        rows = [{"frame": frame, "scene": self.scene, "state": label,
+                 **{phase: times.get(phase, 0) / 1e6 for phase in phases}}
+                for frame, label, times in self.frames]
+
+        with open(self.out_path, "w", newline="") as f:
+            if self.out_path.endswith(".json"):
+                json.dump(rows, f)
+            else:
+                writer = csv.DictWriter(f, fieldnames=["frame", "scene", "state"] + phases)
+                writer.writeheader()
+                writer.writerows(rows)
+
+
+# Instance used by the running scene
+profiler = FrameProfiler(os.path.basename(sys.argv[0]))
@@ -3,13 +3,19 @@ import random
 import math
 import os
 import sys
+import assets
+from fonts import font_registry, get_font
+from sim import HEADLESS, IDLE_TIMEOUT, clock, timestep
+from replay import inputs
+from render import rect_overlay, tint
+from text_cache import render as render_text
+from profiler import profiler
 
 # Initialize pygame
 pygame.init()
 screen_width, screen_height = 800, 650
 screen = pygame.display.set_mode((screen_width, screen_height))
 pygame.display.set_caption("Maya's Memories: The Fragmented Self")
-clock = pygame.time.Clock()
 
 # Game Constants
 GRID_COLS = 4  # Changed to 4 columns for better layout
@@ -17,6 +23,8 @@ GRID_ROWS = 3  # Changed to 3 rows
 CARD_WIDTH, CARD_HEIGHT = 160, 160  # Slightly smaller cards to fit grid
 MARGIN = 20
 LIVES = 3
+PULSE_AMPLITUDE = 0.03  # Face-down cards breathe between 97% and 103% size
+PULSE_FRAMES = 64       # Pre-scaled steps per pulse period
 
 # Colors
 BG_COLOR = (15, 5, 25)
@@ -43,11 +51,7 @@ class Card:
 
 def load_image(path, size=(CARD_WIDTH, CARD_HEIGHT)):
     try:
-        abs_path = os.path.abspath(path)
-        if not os.path.exists(abs_path):
-            raise FileNotFoundError(f"Path does not exist: {abs_path}")
-        image = pygame.image.load(abs_path)
-        return pygame.transform.scale(image, size)
+        return assets.load_image(os.path.abspath(path), size, alpha=True)
     except Exception as e:
         print(f"Error loading image {path}: {e}")
         placeholder = pygame.Surface(size)
@@ -65,13 +69,36 @@ def create_card_back():
         pygame.draw.circle(surface, color, pos, radius)
     return surface
 
+class PulseAnimation:
+    """A sprite pre-scaled at evenly spaced steps of one sin pulse period"""
+    def __init__(self, image, frames=PULSE_FRAMES, amplitude=PULSE_AMPLITUDE):
+        width, height = image.get_size()
+        scaled = {}  # Steps that round to the same size share one Surface
+        self.frames = []  # (Surface, offset that keeps it centered)
+        for i in range(frames):
+            pulse = 1 + amplitude * math.sin(2 * math.pi * i / frames)
+            size = (int(width * pulse), int(height * pulse))
+            if size not in scaled:
+                scaled[size] = pygame.transform.scale(image, size)
+            self.frames.append((scaled[size], ((width - width*pulse)/2, (height - height*pulse)/2)))
+    
+    def frame(self, phase):
+        """(Surface, offset) for a phase in radians"""
+        return self.frames[round(phase / (2 * math.pi) * len(self.frames)) % len(self.frames)]
+
 class Game:
     def __init__(self):
+        # Message sizes are picked from 36-48 at random, open them all up front
+        font_registry.preload("Arial", range(36, 49), bold=True)
+        font_registry.preload("Arial", [20, 24, 48])
+        # Drawing has its own RNG, so a game plays out the same whether or not it is drawn
+        self.shake_rng = random.Random(random.getrandbits(64))
         self.load_assets()
         self.reset_game()
         
     def load_assets(self):
         self.card_back = create_card_back()
+        self.card_back_pulse = PulseAnimation(self.card_back)
         # Get the current file's directory
         base_dir = os.path.dirname(os.path.abspath(__file__))
         stage2_dir = os.path.join(base_dir, "stage2")
@@ -115,18 +142,13 @@ class Game:
                 # Create a colored placeholder with text
                 placeholder = pygame.Surface((CARD_WIDTH, CARD_HEIGHT))
                 placeholder.fill(colors[key])
-                font = pygame.font.SysFont("Arial", 20)
-                text = font.render(key, True, (255, 255, 255))
+                text = get_font("Arial", 20).render(key, True, (255, 255, 255))
                 placeholder.blit(text, (CARD_WIDTH//2 - text.get_width()//2, CARD_HEIGHT//2 - text.get_height()//2))
                 self.images[key] = placeholder
         
         try:
-            bg_path = os.path.join(stage2_dir, "mysterybg.png")
-            if os.path.exists(bg_path):
-                self.background = pygame.image.load(bg_path)
-                self.background = pygame.transform.scale(self.background, (screen_width, screen_height))
-            else:
-                raise FileNotFoundError(f"Background image not found at {bg_path}")
+            # Found in stage2/ or next to the game scripts
+            self.background = assets.load_image("mysterybg.png", (screen_width, screen_height), mapped=True)
         except Exception as e:
             print(f"Error loading background: {e}")
             self.background = pygame.Surface((screen_width, screen_height))
@@ -151,6 +173,7 @@ class Game:
         self.pulse_time = 0
         self.trauma_alpha = 0
         self.positive_alpha = 0
+        self.previous = (self.pulse_time, self.trauma_alpha, self.positive_alpha)  # before the last update, for interpolation
         self.can_select = True
         self.message = ""
         self.message_alpha = 0
@@ -248,7 +271,7 @@ class Game:
                 if len(self.selected_indices) == 2:
                     self.check_match()
                     self.can_select = False
-                    pygame.time.set_timer(CARD_FLIP_BACK_EVENT, 1000)
+                    clock.set_timer(CARD_FLIP_BACK_EVENT, 1000)
                 break
     
     def check_match(self):
@@ -273,7 +296,7 @@ class Game:
                     self.win = True
                     self.game_over = True
                     # Set timer to exit game after showing win message
-                    pygame.time.set_timer(GAME_EXIT_EVENT, 3000)  # Exit after 3 seconds
+                    clock.set_timer(GAME_EXIT_EVENT, 3000)  # Exit after 3 seconds
             else:  # "bad" type
                 self.matched_bad_pairs += 1
                 self.lives -= 1
@@ -294,7 +317,7 @@ class Game:
         self.message_size = random.randint(36, 48)  # Random size for variation
         self.message_color = (255, 80, 80)  # Red for negative messages
         self.is_positive_message = False
-        pygame.time.set_timer(MESSAGE_FADE_EVENT, 2000)  # Message starts fading after 2 seconds
+        clock.set_timer(MESSAGE_FADE_EVENT, 2000)  # Message starts fading after 2 seconds
     
     def show_positive_message(self):
         self.message = random.choice(self.positive_messages)
@@ -302,10 +325,10 @@ class Game:
         self.message_size = random.randint(36, 48)  # Random size for variation
         self.message_color = (100, 255, 150)  # Green for positive messages
         self.is_positive_message = True
-        pygame.time.set_timer(MESSAGE_FADE_EVENT, 2000)  # Message starts fading after 2 seconds
+        clock.set_timer(MESSAGE_FADE_EVENT, 2000)  # Message starts fading after 2 seconds
     
     def handle_flip_back_timer(self):
-        pygame.time.set_timer(CARD_FLIP_BACK_EVENT, 0)
+        clock.set_timer(CARD_FLIP_BACK_EVENT, 0)
         for i in self.selected_indices:
             if not self.cards[i].matched:
                 self.cards[i].selected = False
@@ -313,16 +336,18 @@ class Game:
         self.can_select = True
     
     def handle_message_fade(self):
-        pygame.time.set_timer(MESSAGE_FADE_EVENT, 0)
+        clock.set_timer(MESSAGE_FADE_EVENT, 0)
     
     def handle_game_exit(self):
-        # This is called when the player wins
-        pygame.time.set_timer(GAME_EXIT_EVENT, 0)
-        pygame.quit()
-        sys.exit()
+        # This is called when the player wins, the game closes after this frame
+        clock.set_timer(GAME_EXIT_EVENT, 0)
     
     def update(self):
-        self.pulse_time += 0.05
+        """One fixed step of the pulses and fades"""
+        self.previous = (self.pulse_time, self.trauma_alpha, self.positive_alpha)
+        if not (self.game_over and not self.win):
+            # The card backs stop pulsing behind the lost screen
+            self.pulse_time += 0.05
         self.trauma_alpha = max(0, self.trauma_alpha - 3)
         self.positive_alpha = max(0, self.positive_alpha - 3)
         
@@ -331,37 +356,30 @@ class Game:
             self.message_alpha = max(0, self.message_alpha - 2)
     
     def draw(self):
+        # Pulses and flashes between the last two updates
+        pulse_time, trauma_alpha, positive_alpha = (
+            timestep.interpolate(previous, current) for previous, current
+            in zip(self.previous, (self.pulse_time, self.trauma_alpha, self.positive_alpha)))
+        
         screen.blit(self.background, (0, 0))
         
         # Draw trauma flash (red overlay) for bad matches
-        if self.trauma_alpha > 0:
-            overlay = pygame.Surface((screen_width, screen_height), pygame.SRCALPHA)
-            overlay.fill((*TRAUMA_FLASH[:3], self.trauma_alpha))
-            screen.blit(overlay, (0, 0))
+        if trauma_alpha > 0:
+            tint(screen, TRAUMA_FLASH, int(trauma_alpha))
             
         # Draw positive flash (green overlay) for good matches
-        if self.positive_alpha > 0:
-            overlay = pygame.Surface((screen_width, screen_height), pygame.SRCALPHA)
-            overlay.fill((*POSITIVE_FLASH[:3], self.positive_alpha))
-            screen.blit(overlay, (0, 0))
+        if positive_alpha > 0:
+            tint(screen, POSITIVE_FLASH, int(positive_alpha))
         
         for i, card in enumerate(self.cards):
-            pulse = 1 + 0.03 * math.sin(self.pulse_time * 3 + card.pulse_offset)
-            
             if card.matched or card.selected:
                 glow_color = GOOD_GLOW if card.type == "good" else BAD_GLOW
-                glow = pygame.Surface((CARD_WIDTH+20, CARD_HEIGHT+20), pygame.SRCALPHA)
-                pygame.draw.rect(glow, glow_color, (0, 0, CARD_WIDTH+20, CARD_HEIGHT+20), border_radius=10)
+                glow = rect_overlay((CARD_WIDTH+20, CARD_HEIGHT+20), glow_color, border_radius=10)
                 screen.blit(glow, (card.x-10, card.y-10))
                 screen.blit(self.images[card.image_key], (card.x, card.y))
             else:
-                scaled_back = pygame.transform.scale(
-                    self.card_back,
-                    (int(CARD_WIDTH * pulse), int(CARD_HEIGHT * pulse))
-                )
-                screen.blit(scaled_back, 
-                    (card.x + (CARD_WIDTH - CARD_WIDTH*pulse)/2,
-                     card.y + (CARD_HEIGHT - CARD_HEIGHT*pulse)/2))
+                back, (dx, dy) = self.card_back_pulse.frame(pulse_time * 3 + card.pulse_offset)
+                screen.blit(back, (card.x + dx, card.y + dy))
         
         # Draw lives
         for i in range(self.lives):
@@ -370,19 +388,19 @@ class Game:
         
         # Draw messages (positive or negative)
         if self.message and self.message_alpha > 0:
-            font = pygame.font.SysFont("Arial", self.message_size, bold=True)
-            text = font.render(self.message, True, (*self.message_color, self.message_alpha))
+            # font.render ignores the alpha of the color, so the fade is not part of the key
+            text = render_text(get_font("Arial", self.message_size, bold=True), self.message, self.message_color)
             
             # Add shake effect for negative messages, smooth movement for positive ones
             if self.is_positive_message:
                 # Gentle floating effect for positive messages
-                offset_y = 5 * math.sin(self.pulse_time * 2)
+                offset_y = 5 * math.sin(pulse_time * 2)
                 shake_x = 0
                 shake_y = int(offset_y)
             else:
                 # Random shake for negative messages
-                shake_x = random.randint(-3, 3) if self.message_alpha > 200 else 0
-                shake_y = random.randint(-3, 3) if self.message_alpha > 200 else 0
+                shake_x = self.shake_rng.randint(-3, 3) if self.message_alpha > 200 else 0
+                shake_y = self.shake_rng.randint(-3, 3) if self.message_alpha > 200 else 0
             
             pos_x = screen_width//2 - text.get_width()//2 + shake_x
             pos_y = screen_height//2 - 150 + shake_y  # Above the cards
@@ -393,16 +411,13 @@ class Game:
             screen.blit(text_surface, (pos_x, pos_y))
         
         if self.game_over:
-            overlay = pygame.Surface((screen_width, screen_height), pygame.SRCALPHA)
-            overlay.fill((0, 0, 0, 180))
-            screen.blit(overlay, (0, 0))
+            tint(screen, (0, 0, 0), 180)
             
             if self.win:
                 msg = "Love is within you, remember that..."
                 color = (150, 255, 150)
                 
-                font = pygame.font.SysFont("Arial", 48)
-                text = font.render(msg, True, color)
+                text = render_text(get_font("Arial", 48), msg, color)
                 screen.blit(text, (screen_width//2 - text.get_width()//2, screen_height//2 - 30))
                 
                 # No "try again" text for win condition
@@ -411,38 +426,82 @@ class Game:
                 msg = "Hateress overtakes you, try again."
                 color = (255, 100, 100)
                 
-                font = pygame.font.SysFont("Arial", 48)
-                text = font.render(msg, True, color)
+                text = render_text(get_font("Arial", 48), msg, color)
                 screen.blit(text, (screen_width//2 - text.get_width()//2, screen_height//2 - 30))
                 
                 # Only show "click to try again" for loss condition
-                subtext = pygame.font.SysFont("Arial", 24).render("Click to try again", True, (200, 200, 200))
+                subtext = render_text(get_font("Arial", 24), "Click to try again", (200, 200, 200))
                 screen.blit(subtext, (screen_width//2 - subtext.get_width()//2, screen_height//2 + 30))
 
+def step(game, events):
+    """Handle one frame's events and update the game, without drawing. False once it quits"""
+    running = True
+    for event in events:
+        profiler.handle(event)
+        if event.type == pygame.QUIT:
+            running = False
+        elif event.type == pygame.MOUSEBUTTONDOWN:
+            game.handle_click(event.pos)
+        elif event.type == CARD_FLIP_BACK_EVENT:
+            game.handle_flip_back_timer()
+        elif event.type == MESSAGE_FADE_EVENT:
+            game.handle_message_fade()
+        elif event.type == GAME_EXIT_EVENT:
+            game.handle_game_exit()
+            return False
+    profiler.mark("events")
+    
+    for _ in range(timestep.steps()):
+        game.update()
+    profiler.mark("update")
+    return running
+
+def frame_label(game):
+    """Name of the game's current state for the profiler"""
+    if game.game_over:
+        return "won" if game.win else "lost"
+    if not game.can_select:
+        return "flipping back"
+    return "playing"
+
+def idle_timeout(game):
+    """ms until the screen changes by itself, or None while something on it moves
+
+    Only the lost screen is static, once the flashes and the message have
+    faded (the card backs stop pulsing once the game is lost).
+    """
+    if (game.game_over and not game.win and game.trauma_alpha == 0
+            and game.positive_alpha == 0 and game.message_alpha == 0):
+        return IDLE_TIMEOUT
+    return None
+
 def main():
     game = Game()
     running = True
+    idle_drawn = False    # the frame on screen is the static lost screen
     
     while running:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-            elif event.type == pygame.MOUSEBUTTONDOWN:
-                game.handle_click(event.pos)
-            elif event.type == CARD_FLIP_BACK_EVENT:
-                game.handle_flip_back_timer()
-            elif event.type == MESSAGE_FADE_EVENT:
-                game.handle_message_fade()
-            elif event.type == GAME_EXIT_EVENT:
-                game.handle_game_exit()
-        
-        game.update()
-        game.draw()
-        pygame.display.flip()
-        clock.tick(60)
+        idle = idle_drawn and not clock.simulated
+        events = inputs.frame_events(clock.events(idle_timeout(game) if idle else None))
+        profiler.begin(frame_label(game))
+        running = step(game, events)
+        if idle and not events and idle_timeout(game) is not None:
+            # Nothing happened, the lost screen is still up to date
+            continue
+        if running and not HEADLESS:
+            game.draw()
+            profiler.mark("render")
+            profiler.draw_hud(screen)
+            profiler.mark("hud")
+            pygame.display.flip()
+            profiler.mark("present")
+        idle_drawn = idle_timeout(game) is not None
+        clock.tick()
+        profiler.mark("wait")
+        profiler.end()
     
     pygame.quit()
     sys.exit()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
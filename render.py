@@ -0,0 +1,112 @@
+import os
+import pygame
+
+# Dirty-rectangle rendering for scenes drawn over a static background.
+# Instead of redrawing the whole background and flipping every frame, only
+# the regions sprites covered last frame are restored from the background,
+# and only the old and new sprite rects are pushed to the display.
+
+# Set FRAGMENTS_DIRTY_RECTS=0 to redraw and flip the full screen every frame
+DIRTY_RECTS = os.environ.get("FRAGMENTS_DIRTY_RECTS", "1") != "0"
+
+
+class DirtyRenderer:
+    def __init__(self, screen, enabled=DIRTY_RECTS):
+        self.screen = screen
+        self.enabled = enabled
+        self.background = None
+        self.drawn = []       # rects covered by sprites this frame
+        self.dirty = []       # rects to push to the display
+        self.full_redraw = True
+
+    def invalidate(self):
+        """Redraw everything next frame (another scene drew over the screen)"""
+        self.full_redraw = True
+
+    def begin(self, background):
+        """Start a frame: restore last frame's sprite rects from the background"""
+        if not self.enabled or self.full_redraw or background is not self.background:
+            self.screen.blit(background, (0, 0))
+            self.background = background
+            self.full_redraw = True
+        else:
+            for rect in self.drawn:
+                self.screen.blit(background, rect, rect)
+            self.dirty.extend(self.drawn)
+        self.drawn = []
+
+    def blit(self, surface, pos, area=None):
+        rect = self.screen.blit(surface, pos, area)
+        self.drawn.append(rect)
+        self.dirty.append(rect)
+        return rect
+
+    def present(self):
+        """Push the frame: the changed rects only, or a flip after a full redraw"""
+        if self.full_redraw or not self.enabled:
+            pygame.display.flip()
+            self.full_redraw = False
+        else:
+            pygame.display.update(self.dirty)
+        self.dirty = []
+
+
+class LayerCache:
+    """Static layers composited once into an opaque display-format surface
+
+    compose(surface, *inputs) draws the layers. The result is reused until
+    the target size or any input (compared by identity) changes.
+    """
+
+    def __init__(self, compose):
+        self.compose = compose
+        self.inputs = None
+        self.surface = None
+
+    def invalidate(self):
+        self.inputs = None
+        self.surface = None
+
+    def get(self, size, *inputs):
+        if (self.surface is None or self.surface.get_size() != tuple(size)
+                or len(inputs) != len(self.inputs)
+                or any(a is not b for a, b in zip(inputs, self.inputs))):
+            self.surface = pygame.Surface(size).convert()
+            self.compose(self.surface, *inputs)
+            self.inputs = inputs
+        return self.surface
+
+
+_tints = {}    # (size, color) -> opaque Surface filled with the color
+
+
+def tint(target, color, alpha, rect=None):
+    """Blend a flat color over target (or a rect of it) at the given alpha
+
+    Looks the same as blitting a full-size SRCALPHA surface filled with
+    (*color, alpha). One overlay per (size, color) is filled once; each
+    frame only sets its surface alpha and blits it.
+    """
+    rect = pygame.Rect(rect) if rect is not None else target.get_rect()
+    key = (rect.size, tuple(color[:3]))
+    overlay = _tints.get(key)
+    if overlay is None:
+        overlay = pygame.Surface(rect.size, 0, target)
+        overlay.fill(color[:3])
+        _tints[key] = overlay
+    overlay.set_alpha(alpha)
+    target.blit(overlay, rect.topleft)
+
+
+_shapes = {}   # (size, color, width, border_radius) -> SRCALPHA Surface
+
+
+def rect_overlay(size, color, width=0, border_radius=0):
+    """Transparent surface with a (possibly translucent) rect drawn on it, made once per shape"""
+    key = (tuple(size), tuple(color), width, border_radius)
+    surface = _shapes.get(key)
+    if surface is None:
+        surface = pygame.Surface(size, pygame.SRCALPHA)
+        pygame.draw.rect(surface, color, surface.get_rect(), width, border_radius=border_radius)
+        _shapes[key] = surface
+    return surface
@@ -0,0 +1,134 @@
+import atexit
+import os
+import random
+import struct
+import pygame
+from sim import clock, key_state
+
+# Input recording and replay.
+# FRAGMENTS_RECORD=run.rec logs the random seed and every input event with
+# the frame it arrived on; FRAGMENTS_REPLAY=run.rec seeds the game the same
+# way and feeds those events back on the same frames. Both run on fixed
+# virtual time (one frame = 1000/60 ms), so a replay goes through exactly
+# the same game states and draws exactly the same frames as the recording.
+# Replays run as fast as the game can draw, which makes them repeatable
+# workloads for timing render changes. FRAGMENTS_SEED fixes the seed of a
+# recording (random otherwise).
+#
+# Import this before any game state is created so the seed applies to it.
+
+MAGIC = b"FRIN"
+VERSION = 1
+HEADER = struct.Struct("<4sHQ")     # magic, version, seed
+EVENT = struct.Struct("<IHihh")     # frame, event type, key or button, x, y
+END = 0                             # event type marking the last frame
+
+INPUT_EVENTS = (pygame.KEYDOWN, pygame.KEYUP, pygame.MOUSEBUTTONDOWN,
+                pygame.MOUSEBUTTONUP, pygame.MOUSEMOTION, pygame.QUIT)
+
+
+def is_recorded(event):
+    # Input, plus the scenes' timer events so their order within a frame is kept
+    return event.type in INPUT_EVENTS or pygame.USEREVENT <= event.type < pygame.NUMEVENTS
+
+
+def pack_event(frame, event):
+    if event.type in (pygame.KEYDOWN, pygame.KEYUP):
+        return EVENT.pack(frame, event.type, event.key, 0, 0)
+    if event.type in (pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP):
+        return EVENT.pack(frame, event.type, event.button, *event.pos)
+    if event.type == pygame.MOUSEMOTION:
+        return EVENT.pack(frame, event.type, 0, *event.pos)
+    return EVENT.pack(frame, event.type, 0, 0, 0)
+
+
+def unpack_event(event_type, value, x, y):
+    if event_type in (pygame.KEYDOWN, pygame.KEYUP):
+        return pygame.event.Event(event_type, key=value, mod=0, unicode="", scancode=0)
+    if event_type in (pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP):
+        return pygame.event.Event(event_type, pos=(x, y), button=value)
+    if event_type == pygame.MOUSEMOTION:
+        return pygame.event.Event(event_type, pos=(x, y), rel=(0, 0), buttons=(0, 0, 0))
+    return pygame.event.Event(event_type)
+
+
+class LiveInput:
+    """Events straight from the window"""
+
+    def frame_events(self, events):
+        return events
+
+
+class Recorder:
+    def __init__(self, path, seed):
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, seed))
+        self.frame = 0
+        atexit.register(self.close)
+
+    def frame_events(self, events):
+        """Log this frame's input and pass the events on"""
+        for event in events:
+            if is_recorded(event):
+                self.file.write(pack_event(self.frame, event))
+        self.frame += 1
+        return events
+
+    def close(self):
+        if not self.file.closed:
+            self.file.write(EVENT.pack(self.frame, END, 0, 0, 0))
+            self.file.close()
+
+
+class Replayer:
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, version, self.seed = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not an input recording: {path}")
+
+        self.frames = {}      # frame -> recorded events
+        self.end = None
+        for frame, event_type, value, x, y in EVENT.iter_unpack(data[HEADER.size:]):
+            if event_type == END:
+                self.end = frame
+            else:
+                self.frames.setdefault(frame, []).append(unpack_event(event_type, value, x, y))
+        self.frame = 0
+
+    def frame_events(self, events):
+        """The recorded events of this frame; live input is ignored except closing the window"""
+        if self.end is not None and self.frame >= self.end:
+            return [pygame.event.Event(pygame.QUIT)]
+        recorded = self.frames.get(self.frame, [])
+        self.frame += 1
+        # Timer events are replayed from the recording too, the clock's own ones are dropped
+        return [e for e in events if e.type == pygame.QUIT] + recorded
+
+
+def start():
+    """Set up recording or replay from the environment, seeding the game"""
+    record_path = os.environ.get("FRAGMENTS_RECORD")
+    replay_path = os.environ.get("FRAGMENTS_REPLAY")
+    if not record_path and not replay_path:
+        return LiveInput()
+
+    if replay_path:
+        source = Replayer(replay_path)
+        seed = source.seed
+    else:
+        # The header stores the seed as an unsigned 64-bit number
+        seed = int(os.environ.get("FRAGMENTS_SEED") or random.getrandbits(64)) % 2 ** 64
+        source = Recorder(record_path, seed)
+    random.seed(seed)
+
+    # Fixed virtual time and keyboard state taken from the events only
+    clock.simulated = True
+    clock.paced = not replay_path
+    key_state.simulated = True
+    return source
+
+
+# Input source used by every scene
+inputs = start()
@@ -0,0 +1,124 @@
+import numpy as np
+
+# Mirror puzzle geometry built on NumPy arrays.
+# The grid corners, the jittered points along every shared edge and the
+# start positions are computed as whole arrays, so a 40x30 puzzle takes
+# about as long to lay out as a 5x4 one. Every function takes a
+# numpy.random.Generator, so the same seed gives the same layout.
+
+MAX_EDGE_POINTS = 2
+
+
+def _edge_points(starts, step, count, jitter_dir, rng, scale, low, high, axis):
+    """Points along a set of edges, offset sideways by a small random amount
+
+    starts are the first corner of each edge (..., 2) and step the vector
+    to the second one. Edges get count (1 or MAX_EDGE_POINTS) points each;
+    the unused slot of one-point edges is masked out.
+    """
+    slots = np.arange(1, MAX_EDGE_POINTS + 1)
+    t = slots / (count[..., None] + 1)                       # (..., slots)
+    valid = slots <= count[..., None]
+    points = starts[..., None, :] + t[..., None] * step       # (..., slots, 2)
+    offset = rng.uniform(3, 10, size=points.shape[:-1]) * scale * jitter_dir[..., None]
+    side = 1 - axis
+    points[..., side] = np.clip(points[..., side] + offset, low, high)
+    return points, valid
+
+
+def grid_pieces(cols, rows, rect, rng, scale=1.0):
+    """Cut rect (x, y, width, height) into cols x rows jigsaw-like pieces
+
+    Neighbouring pieces share the exact same edge points, so there are no
+    gaps. Returns the vertex array of each piece (column-major, like the
+    grid loops) and the (cols * rows, 2) array of cell centers.
+    """
+    x, y, width, height = rect
+    cell = np.array([width / cols, height / rows])
+    xs = x + np.arange(cols + 1) * cell[0]
+    ys = y + np.arange(rows + 1) * cell[1]
+    corners = np.stack(np.meshgrid(xs, ys, indexing="ij"), axis=-1)   # (cols+1, rows+1, 2)
+
+    # Horizontal edges (cols, rows+1) jitter in y, vertical edges (cols+1, rows) in x;
+    # the outer border always bulges the same way
+    h_dir = rng.choice([-1, 1], size=(cols, rows + 1))
+    h_dir[:, [0, -1]] = -1
+    v_dir = rng.choice([-1, 1], size=(cols + 1, rows))
+    v_dir[[0, -1], :] = -1
+    h_count = rng.integers(1, MAX_EDGE_POINTS + 1, size=(cols, rows + 1))
+    v_count = rng.integers(1, MAX_EDGE_POINTS + 1, size=(cols + 1, rows))
+    h_points, h_valid = _edge_points(corners[:-1, :], np.array([cell[0], 0]), h_count, h_dir,
+                                     rng, scale, y, y + height, axis=0)
+    v_points, v_valid = _edge_points(corners[:, :-1], np.array([0, cell[1]]), v_count, v_dir,
+                                     rng, scale, x, x + width, axis=1)
+
+    # Walk each cell clockwise: corner, top edge, corner, right edge,
+    # corner, bottom edge (reversed), corner, left edge (reversed)
+    one = np.ones((cols, rows, 1), dtype=bool)
+    parts = [
+        (corners[:-1, :-1, None], one),
+        (h_points[:, :-1], h_valid[:, :-1]),
+        (corners[1:, :-1, None], one),
+        (v_points[1:, :], v_valid[1:, :]),
+        (corners[1:, 1:, None], one),
+        (h_points[:, 1:, ::-1], h_valid[:, 1:, ::-1]),
+        (corners[:-1, 1:, None], one),
+        (v_points[:-1, :, ::-1], v_valid[:-1, :, ::-1]),
+    ]
+    vertices = np.concatenate([p for p, _ in parts], axis=2).reshape(cols * rows, -1, 2)
+    valid = np.concatenate([v for _, v in parts], axis=2).reshape(cols * rows, -1)
+    pieces = [v[m] for v, m in zip(vertices, valid)]
+
+    centers = (corners[:-1, :-1] + cell / 2).reshape(-1, 2)
+    return pieces, centers
+
+
+def fake_pieces(centers, rng, scale=1.0, min_vertices=4, max_vertices=7):
+    """Irregular polygons (4-7 vertices, radius 20-40) around each center"""
+    count = len(centers)
+    vertices = rng.integers(min_vertices, max_vertices + 1, size=count)
+    slots = np.arange(max_vertices)
+    angles = 2 * np.pi * slots / vertices[:, None]
+    radius = rng.uniform(20, 40, size=(count, max_vertices)) * scale
+    points = centers[:, None, :] + radius[..., None] * np.stack([np.cos(angles), np.sin(angles)], axis=-1)
+    return [p[:n] for p, n in zip(points, vertices)]
+
+
+def glass_lines(vertex_counts, rng, lines=3):
+    """Random (start, end) vertex index pairs for each shard's glass streaks"""
+    counts = np.asarray(vertex_counts)
+    return (rng.random((len(counts), lines, 2)) * counts[:, None, None]).astype(int)
+
+
+def scatter(count, area, exclude, rng):
+    """count blue-noise points in area (x, y, width, height), none inside exclude
+
+    Jittered grid: the area is split into square cells, count of the cells
+    that clear the excluded rect are picked and each gets one point at a
+    random spot inside it. Points never share a cell, so they spread out
+    evenly, and the time taken doesn't depend on how full the area is.
+    """
+    x, y, width, height = area
+    ex, ey, ew, eh = exclude
+    free = width * height - max(0, min(x + width, ex + ew) - max(x, ex)) * max(0, min(y + height, ey + eh) - max(y, ey))
+    # Aim for some spare cells so the picks stay random
+    size = np.sqrt(max(free, 1) / (count * 1.5))
+
+    while True:
+        cols, rows = max(1, int(width // size)), max(1, int(height // size))
+        left = x + np.arange(cols) * size
+        top = y + np.arange(rows) * size
+        cell_x, cell_y = (a.ravel() for a in np.meshgrid(left, top, indexing="ij"))
+        clear = ((cell_x + size <= ex) | (cell_x >= ex + ew) |
+                 (cell_y + size <= ey) | (cell_y >= ey + eh))
+        candidates = np.flatnonzero(clear)
+        if len(candidates) >= count or size < 1:
+            break
+        size *= 0.9
+
+    picked = rng.choice(candidates, size=min(count, len(candidates)), replace=False)
+    if len(picked) < count:
+        # Area too small for one cell per point, let the extra points share cells
+        picked = np.concatenate([picked, rng.choice(candidates, size=count - len(picked))])
+    jitter = rng.random((count, 2)) * size
+    return np.stack([cell_x[picked], cell_y[picked]], axis=-1) + jitter
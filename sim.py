@@ -0,0 +1,189 @@
+import os
+import time
+
+# Headless simulation support shared by all scenes.
+# FRAGMENTS_HEADLESS=1 runs a scene on SDL's dummy video and audio drivers,
+# skips all drawing and takes game time from a simulated clock that moves
+# one fixed frame per tick without sleeping, so the game logic runs as fast
+# as the CPU allows (see simulate.py). Import this before pygame.init() so
+# the drivers are picked up.
+#
+# Game logic runs at a fixed UPDATE_RATE whatever the frame rate (see
+# FixedTimestep). FRAGMENTS_FPS sets how often real-time runs draw: 30, 60,
+# 144..., or 0 for uncapped.
+
+HEADLESS = os.environ.get("FRAGMENTS_HEADLESS") == "1"
+
+if HEADLESS:
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+
+import pygame
+
+# Longest an idle screen sleeps before looking at its own timers again
+IDLE_TIMEOUT = 1000
+
+# Game updates per second; per-update speeds in the scenes are tuned for it
+UPDATE_RATE = 60
+
+
+def read_frame_rate(default):
+    try:
+        return max(0, int(os.environ.get("FRAGMENTS_FPS", default)))
+    except ValueError:
+        # Not a whole number, e.g. "60hz"
+        return default
+
+
+FRAME_RATE = read_frame_rate(UPDATE_RATE)
+# Most updates run to catch up after a slow frame, the rest of the time is dropped
+MAX_CATCH_UP = 8
+
+
+class GameClock:
+    """Frame limiter and source of game time for a scene
+
+    Real clocks wrap pygame.time. Simulated clocks advance exactly one frame
+    per tick() and fire set_timer events on simulated time instead.
+    """
+
+    def __init__(self, simulated=HEADLESS, paced=False, frame_rate=FRAME_RATE):
+        self.simulated = simulated
+        self.paced = paced    # simulated time, but still wait for the frame rate (recording)
+        self.frame_rate = frame_rate
+        self.clock = pygame.time.Clock()
+        self.time = 0.0       # simulated milliseconds
+        self.timers = {}      # event type -> [due time, interval, loops left (0 = forever)]
+
+    def get_ticks(self):
+        """Milliseconds of game time, like pygame.time.get_ticks()"""
+        if self.simulated:
+            return int(self.time)
+        return pygame.time.get_ticks()
+
+    def now(self):
+        """Game time in fractional milliseconds, for the fixed timestep"""
+        if self.simulated:
+            return self.time
+        return time.perf_counter() * 1000
+
+    def tick(self, fps=None):
+        """End a frame: wait for the frame rate (real) or advance one frame (simulated)
+
+        fps defaults to frame_rate for real clocks. Simulated clocks default
+        to one update per frame, so recordings replay the same whatever
+        FRAGMENTS_FPS is.
+        """
+        if not self.simulated:
+            return self.clock.tick(self.frame_rate if fps is None else fps)
+        fps = fps or UPDATE_RATE
+        if self.paced:
+            self.clock.tick(fps)
+        return self.advance(1000 / fps)
+
+    def advance(self, ms):
+        """Move simulated time forward, posting the timer events that came due"""
+        start = int(self.time)
+        self.time += ms
+        now = int(self.time)
+        for event_type, timer in list(self.timers.items()):
+            while timer[0] <= now:
+                pygame.event.post(pygame.event.Event(event_type))
+                if timer[2] == 1:
+                    del self.timers[event_type]
+                    break
+                timer[0] += timer[1]
+                timer[2] = max(0, timer[2] - 1)
+        return now - start
+
+    def events(self, idle_timeout=None):
+        """This frame's events, like pygame.event.get()
+
+        With idle_timeout (ms) a real clock blocks until an event arrives
+        or the time is up, so a static screen sleeps instead of polling 60
+        times a second. Simulated clocks never wait: recorded and headless
+        runs keep exactly one step per frame.
+        """
+        if idle_timeout is None or self.simulated:
+            return pygame.event.get()
+        event = pygame.event.wait(max(1, min(int(idle_timeout), IDLE_TIMEOUT)))
+        events = [] if event.type == pygame.NOEVENT else [event]
+        return events + pygame.event.get()
+
+    def set_timer(self, event_type, millis, loops=0):
+        """Same as pygame.time.set_timer: 0 ms stops the timer"""
+        if not self.simulated:
+            pygame.time.set_timer(event_type, millis, loops)
+        elif millis <= 0:
+            self.timers.pop(event_type, None)
+        else:
+            self.timers[event_type] = [int(self.time) + millis, millis, loops]
+
+
+class KeyState:
+    """Keyboard state, like pygame.key.get_pressed()
+
+    SDL's key state doesn't see posted events, so simulated runs track the
+    keys from the KEYDOWN/KEYUP events each scene passes to handle().
+    """
+
+    def __init__(self, simulated=HEADLESS):
+        self.simulated = simulated
+        self.down = set()
+
+    def handle(self, event):
+        if event.type == pygame.KEYDOWN:
+            self.down.add(event.key)
+        elif event.type == pygame.KEYUP:
+            self.down.discard(event.key)
+
+    def get_pressed(self):
+        if not self.simulated:
+            return pygame.key.get_pressed()
+        return self
+
+    def __getitem__(self, key):
+        return key in self.down
+
+
+class FixedTimestep:
+    """Runs game updates at a fixed rate, however often frames are drawn
+
+    The time since the last frame goes into an accumulator that is spent
+    in whole update steps. alpha is how far the frame lies between the
+    last two updates, for interpolating what is drawn.
+    """
+
+    def __init__(self, rate=UPDATE_RATE, game_clock=None):
+        self.step_ms = 1000 / rate
+        self.clock = game_clock
+        self.last = None
+        self.accumulator = 0.0
+        self.alpha = 1.0
+
+    def steps(self):
+        """Number of updates due this frame"""
+        now = self.clock.now()
+        if self.last is None:
+            self.last = now
+            return 1
+        self.accumulator += now - self.last
+        self.last = now
+        # The small epsilon absorbs rounding when frames are exactly one step apart
+        count = int((self.accumulator + 1e-6) // self.step_ms)
+        if count > MAX_CATCH_UP:
+            count = MAX_CATCH_UP
+            self.accumulator = 0.0
+        self.accumulator = max(0.0, self.accumulator - count * self.step_ms)
+        self.alpha = min(1.0, self.accumulator / self.step_ms)
+        return count
+
+    def interpolate(self, previous, current):
+        """A value between its state before and after the last update"""
+        return previous + (current - previous) * self.alpha
+
+
+# Instances used by every scene
+clock = GameClock()
+key_state = KeyState()
+timestep = FixedTimestep(game_clock=clock)
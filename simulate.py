@@ -0,0 +1,187 @@
+import argparse
+import os
+import random
+import runpy
+import sys
+import time
+
+# Runs a scene headless with a simple autoplayer, as fast as the CPU allows.
+# Game time comes from the simulated clock in sim.py, so a run gives the same
+# game regardless of how fast the machine is.
+#
+#   python simulate.py piano.py --frames 100000
+#   python simulate.py puzzle.py --frames 50000 --seed 3
+
+os.environ["FRAGMENTS_HEADLESS"] = "1"
+
+import pygame
+from sim import clock
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def key_press(key):
+    return [pygame.event.Event(pygame.KEYDOWN, key=key, mod=0, unicode="", scancode=0),
+            pygame.event.Event(pygame.KEYUP, key=key, mod=0, unicode="", scancode=0)]
+
+
+def click(pos):
+    return [pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=pos, button=1),
+            pygame.event.Event(pygame.MOUSEBUTTONUP, pos=pos, button=1)]
+
+
+class PianoPlayer:
+    """Walks to the piano and plays the sequences, mistyping a note now and then"""
+
+    def __init__(self, scene, rng, mistakes=0.1):
+        self.scene = scene
+        self.rng = rng
+        self.mistakes = mistakes
+        self.held = None
+        self.stats = {"sequences": 0, "correct": 0, "victories": 0}
+        self.feedback = False
+
+    def events(self):
+        ns, state = self.scene, self.scene["state"]
+        notes = {note['name']: note['key'] for note in ns["piano_notes"]}
+        events = []
+
+        if state.stage_state == ns["STAGE_FOREST"]:
+            want = None if state.show_message else (pygame.K_RIGHT if state.x < 600 else pygame.K_LEFT)
+            if want != self.held:
+                if self.held is not None:
+                    events.append(pygame.event.Event(pygame.KEYUP, key=self.held, mod=0, unicode="", scancode=0))
+                if want is not None:
+                    events.append(pygame.event.Event(pygame.KEYDOWN, key=want, mod=0, unicode="", scancode=0))
+                self.held = want
+            if state.show_message:
+                events += key_press(pygame.K_x)
+        elif state.stage_state == ns["STAGE_PIANO"]:
+            if state.piano_state == ns["STATE_PIANO"]:
+                events += key_press(pygame.K_RETURN)
+            elif state.piano_state == ns["STATE_GUESSING"]:
+                done = len(state.player_sequence)
+                if done < len(state.current_sequence):
+                    name = state.current_sequence[done]
+                    if self.rng.random() < self.mistakes:
+                        name = self.rng.choice(list(notes))
+                    events += key_press(notes[name])
+                else:
+                    events += key_press(pygame.K_RETURN)
+        elif state.stage_state == ns["VICTORY_SCREEN"]:
+            self.stats["victories"] += 1
+            events += key_press(pygame.K_SPACE)
+
+        feedback = state.stage_state == ns["STAGE_PIANO"] and state.piano_state == ns["STATE_FEEDBACK"]
+        if feedback and not self.feedback:
+            self.stats["sequences"] += 1
+            self.stats["correct"] += state.player_sequence == state.current_sequence
+        self.feedback = feedback
+        return events
+
+    def step(self, events):
+        return self.scene["step"](events)
+
+
+class CardPlayer:
+    """Turns over random face-down cards until the game is won or lost"""
+
+    def __init__(self, scene, rng):
+        self.scene = scene
+        self.rng = rng
+        self.game = scene["Game"]()
+        self.stats = {"games": 0, "wins": 0, "losses": 0}
+
+    def events(self):
+        ns, game = self.scene, self.game
+        if game.game_over and not game.win:
+            self.stats["games"] += 1
+            self.stats["losses"] += 1
+            return click((0, 0))
+        if not game.can_select:
+            return []
+        hidden = [card for card in game.cards if not card.matched and not card.selected]
+        card = self.rng.choice(hidden)
+        return click((card.x + ns["CARD_WIDTH"] // 2, card.y + ns["CARD_HEIGHT"] // 2))
+
+    def step(self, events):
+        if not self.scene["step"](self.game, events):
+            # Won: the scene would close here, start another game instead
+            self.stats["games"] += 1
+            self.stats["wins"] += 1
+            self.game = self.scene["Game"]()
+        return True
+
+
+class MirrorPlayer:
+    """Drags random loose real shards onto their targets"""
+
+    def __init__(self, scene, rng):
+        self.scene = scene
+        self.rng = rng
+        self.game = scene["Game"]()
+        self.stats = {"games": 0, "drags": 0}
+
+    def events(self):
+        game = self.game
+        if game.game_completed:
+            self.stats["games"] += 1
+            return click((0, 0))
+        loose = [shard for shard in game.shards if shard.is_real and not shard.placed]
+        shard = self.rng.choice(loose)
+        # Grab the shard at a pixel that belongs to it, drop it on its target
+        local = shard.mask.centroid()
+        grab = (int(shard.pos[0] - shard.width / 2) + local[0], int(shard.pos[1] - shard.height / 2) + local[1])
+        drop = (grab[0] + shard.puzzle_pos[0] - shard.pos[0], grab[1] + shard.puzzle_pos[1] - shard.pos[1])
+        self.stats["drags"] += 1
+        return [pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=grab, button=1),
+                pygame.event.Event(pygame.MOUSEMOTION, pos=drop, rel=(0, 0), buttons=(1, 0, 0)),
+                pygame.event.Event(pygame.MOUSEBUTTONUP, pos=drop, button=1)]
+
+    def step(self, events):
+        return self.scene["step"](self.game, events, 1000 // 60)
+
+
+PLAYERS = {
+    "pygameee.py": PianoPlayer,
+    "fewf.py": PianoPlayer,
+    "piano.py": PianoPlayer,
+    "puzzle.py": CardPlayer,
+    "mother": MirrorPlayer,
+}
+
+
+def load_scene(name):
+    """Run a scene's setup (window, assets, state) without entering its main loop"""
+    path = os.path.join(BASE_DIR, name)
+    sys.path.insert(0, BASE_DIR)
+    return runpy.run_path(path, run_name="simulation")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a scene headless with an autoplayer")
+    parser.add_argument("scene", choices=sorted(PLAYERS))
+    parser.add_argument("--frames", type=int, default=10000, help="frames to simulate")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the autoplayer and the game")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    os.environ.setdefault("FRAGMENTS_MIRROR_SEED", str(args.seed))
+    scene = load_scene(args.scene)
+    player = PLAYERS[args.scene](scene, random.Random(args.seed))
+
+    start = time.perf_counter()
+    for _ in range(args.frames):
+        if not player.step(pygame.event.get() + player.events()):
+            break
+        clock.tick(60)
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.frames} frames ({clock.get_ticks() / 1000:.0f} s of game time) in {elapsed:.2f} s, "
+          f"{args.frames / elapsed:.0f} frames/s")
+    for name, value in player.stats.items():
+        print(f"  {name}: {value}")
+
+
+if __name__ == "__main__":
+    main()
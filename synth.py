@@ -0,0 +1,108 @@
+import numpy as np
+import pygame
+
+# Procedural piano notes.
+# Each note is a sum of decaying partials shaped by an ADSR envelope,
+# computed as whole NumPy arrays in the mixer's sample format and handed
+# to pygame.mixer.Sound(buffer=...). Any pitch works (all 12 semitones, A0
+# to C8 and beyond), nothing is decoded or stored on disk, and every pitch
+# is synthesized once per mixer setup.
+
+SEMITONES = {"C": 0, "D": 2, "E": 4, "F": 5, "G": 7, "A": 9, "B": 11}
+A4_MIDI = 69
+A4_FREQUENCY = 440.0
+
+PARTIALS = 12
+INHARMONICITY = 0.0004     # stiff strings: upper partials run slightly sharp
+PEAK = 0.6                 # of full scale, leaves room for chords
+
+# Envelope: attack, decay and release in seconds, sustain level
+ATTACK = 0.005
+DECAY = 0.4
+SUSTAIN = 0.35
+RELEASE = 0.3
+
+SAMPLE_TYPES = {8: np.uint8, -8: np.int8, 16: np.uint16, -16: np.int16, -32: np.int32}
+
+
+def midi_number(name):
+    """MIDI note number of a name like "A3", "C#4" or "Bb2" """
+    letter, rest = name[0].upper(), name[1:]
+    semitone = SEMITONES[letter]
+    while rest[:1] in ("#", "b"):
+        semitone += 1 if rest[0] == "#" else -1
+        rest = rest[1:]
+    return 12 * (int(rest) + 1) + semitone
+
+
+def frequency(note):
+    """Frequency in Hz of a note name or MIDI number (equal temperament, A4 = 440 Hz)"""
+    midi = midi_number(note) if isinstance(note, str) else note
+    return A4_FREQUENCY * 2 ** ((midi - A4_MIDI) / 12)
+
+
+def envelope(count, rate, attack=ATTACK, decay=DECAY, sustain=SUSTAIN, release=RELEASE):
+    """ADSR gain for count samples; the release takes up the end of the note"""
+    end = count / rate
+    release_start = max(attack + decay, end - release)
+    return np.interp(np.arange(count) / rate,
+                     [0, attack, attack + decay, release_start, end],
+                     [0, 1, sustain, sustain, 0])
+
+
+def synthesize(hz, rate, duration=1.5, partials=PARTIALS):
+    """One note as float samples in [-PEAK, PEAK]"""
+    # float32 throughout: phase rounding stays within a few degrees over a note
+    t = np.arange(int(duration * rate), dtype=np.float32) / np.float32(rate)
+    n = np.arange(1, partials + 1, dtype=np.float32)[:, None]
+    partial_hz = n * np.float32(hz) * np.sqrt(1 + np.float32(INHARMONICITY) * n ** 2)
+    # Softer and shorter-lived the higher the partial, none above Nyquist
+    amplitude = np.where(partial_hz < rate / 2, 1 / n ** 1.5, 0).astype(np.float32)
+    decay = np.exp(-t * ((1.0 + 0.6 * n) * (hz / 220) ** 0.5).astype(np.float32))
+    wave = (amplitude * decay * np.sin(np.float32(2 * np.pi) * partial_hz * t)).sum(axis=0)
+    wave *= envelope(len(t), rate)
+    return wave * (PEAK / max(np.abs(wave).max(), 1e-9))
+
+
+def to_mixer_format(wave, mixer):
+    """Float samples as a raw buffer in the mixer's format and channel count"""
+    _, fmt, channels = mixer
+    dtype = SAMPLE_TYPES.get(fmt)
+    if dtype is None:
+        samples = wave.astype(np.float32)
+    else:
+        info = np.iinfo(dtype)
+        middle = (int(info.max) + int(info.min) + 1) // 2
+        samples = (wave * (info.max - middle) + middle).astype(dtype)
+    return np.repeat(samples[:, None], channels, axis=1).tobytes()
+
+
+class PianoSynth:
+    def __init__(self, duration=1.5):
+        self.duration = duration
+        self.sounds = {}      # (midi number, mixer settings) -> Sound
+
+    def sound(self, note):
+        """Sound for a note name or MIDI number, or None without a mixer"""
+        mixer = pygame.mixer.get_init()
+        if mixer is None:
+            return None
+        midi = midi_number(note) if isinstance(note, str) else note
+        key = (midi, mixer)
+        sound = self.sounds.get(key)
+        if sound is None:
+            wave = synthesize(frequency(midi), mixer[0], self.duration)
+            sound = pygame.mixer.Sound(buffer=to_mixer_format(wave, mixer))
+            self.sounds[key] = sound
+        return sound
+
+    def clear(self):
+        self.sounds.clear()
+
+
+# Instance shared by every scene
+piano_synth = PianoSynth()
+
+
+def note_sound(note):
+    return piano_synth.sound(note)
@@ -0,0 +1,56 @@
+from collections import OrderedDict
+
+# Rendered text cache shared by all scenes.
+# Most labels are the same string in the same font every frame, so each
+# (font, text, color, antialias) combination is rasterized once and the
+# Surface is reused until it falls out of the LRU.
+
+MAX_ENTRIES = 256
+
+
+class TextCache:
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()   # key -> rendered Surface, oldest first
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, color, antialias=True):
+        """Same as font.render(text, antialias, color), but cached
+
+        A Font object stands for one family at one size, so it is part of the
+        key as is. The returned Surface is shared: blit it, don't draw on it.
+        """
+        key = (font, font.get_height(), text, tuple(color), antialias)
+        surface = self.entries.get(key)
+        if surface is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        surface = font.render(text, antialias, color)
+        self.entries[key] = surface
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return surface
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+# Instance used by every scene
+text_cache = TextCache()
+
+
+def render(font, text, color, antialias=True):
+    return text_cache.render(font, text, color, antialias)